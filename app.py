@@ -2,17 +2,52 @@
 # الاستيرادات
 # ======================================================
 import io
-import zipfile
+import os
 import json
-import random
+import tempfile
+from contextlib import contextmanager
 import streamlit as st
-import pandas as pd
 
-from shapely.geometry import Polygon, Point
-from shapely.strtree import STRtree
-from bs4 import BeautifulSoup
-from xml.dom.minidom import Document
-import xml.etree.ElementTree as ET
+from shapely.geometry import Point
+
+from kmz_zone_app import (
+    NEAREST_MODES,
+    ZONE_POLICIES,
+    DEFAULT_PRIORITY_COLUMN,
+    ZoneLayerCache,
+    file_sha256,
+    parse_kmz_or_kml,
+    load_polygons_from_excel,
+    compile_zones,
+    load_compiled_zones,
+    find_point,
+    run_points_test,
+    add_nearest_zone_columns,
+    ZONE_STYLE_MODES,
+    DEFAULT_PALETTE_SIZE,
+    write_kml_z,
+    write_kml_z_lod,
+    export_points_to_kml,
+    write_points_kml,
+    POINT_FILE_TYPES,
+    TABLE_MIME_TYPES,
+    auto_table_format,
+    write_points_table,
+    write_zones_table,
+    ZONE_CHANGE_FILE_TYPES,
+    load_zone_changes,
+    ZoneStore,
+    polygon_coordinates,
+    DEFAULT_MIN_AREA_SQM,
+    zone_qa_report,
+    repair_invalid_zones,
+    write_qa_excel,
+    write_qa_kml,
+    read_points_table,
+    run_points_pipeline,
+    JobCancelled,
+    JobMonitor
+)
 
 
 # ======================================================
@@ -27,447 +62,137 @@ st.title("🗺️ أداة استخراج وفحص الزونات (KMZ / KML / E
 
 
 # ======================================================
-# دوال مساعدة
+# ذاكرة مؤقتة مشتركة لطبقات الزونات
 # ======================================================
+# الحد الأقصى لحجم الطبقات المحفوظة في الذاكرة (ميجابايت)
+ZONE_CACHE_MAX_MB = int(os.environ.get("KMZ_ZONE_CACHE_MB", "1024"))
+# جدول البحث الشبكي للنقاط المتكررة: حجم الخلية بالمتر (0 = بدون) والحد الأقصى للذاكرة
+ZONE_GRID_M = float(os.environ.get("KMZ_ZONE_GRID_M", "0"))
+ZONE_GRID_MB = int(os.environ.get("KMZ_ZONE_GRID_MB", "256"))
 
-def random_kml_color(fill_alpha="55", line_alpha="FF"):
-    """توليد لون عشوائي لـ KML"""
-    r, g, b = [random.randint(0, 255) for _ in range(3)]
-    return (
-        f"{fill_alpha}{b:02x}{g:02x}{r:02x}",
-        f"{line_alpha}{b:02x}{g:02x}{r:02x}"
-    )
-
-def calculate_area_in_sqm(polygon):
-    """حساب مساحة البوليقون بالمتر المربع باستخدام تقريب"""
-    # تحويل من درجات إلى متر (تقريبي)
-    # عند خط الاستواء: 1 درجة ≈ 111 كم
-    # نستخدم نقطة المنتصف لحساب أدق
-    centroid = polygon.centroid
-    lat = centroid.y
-    
-    # عامل التحويل للطول (longitude) يعتمد على خط العرض
-    # 1 درجة طول = 111320 * cos(lat) متر
-    # 1 درجة عرض = 111320 متر
-    import math
-    lon_factor = 111320 * math.cos(math.radians(lat))
-    lat_factor = 111320
-    
-    # حساب المساحة بالدرجات المربعة ثم تحويلها
-    area_deg = polygon.area
-    area_sqm = area_deg * lon_factor * lat_factor
-    
-    return area_sqm
-
-
-def calculate_distance_in_meters(point1, point2):
-    """حساب المسافة بين نقطتين بالمتر"""
-    import math
-    
-    # استخراج الإحداثيات
-    if isinstance(point1, Point):
-        lon1, lat1 = point1.x, point1.y
-    else:
-        lon1, lat1 = point1
-        
-    if isinstance(point2, Point):
-        lon2, lat2 = point2.x, point2.y
-    else:
-        lon2, lat2 = point2
-    
-    # حساب المسافة باستخدام صيغة Haversine
-    R = 6371000  # نصف قطر الأرض بالمتر
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    distance = R * c
-    return distance
-
-def parse_kmz_or_kml(uploaded_file):
-    """قراءة KMZ أو KML واستخراج البوليقونز"""
-    if uploaded_file.name.lower().endswith(".kmz"):
-        with zipfile.ZipFile(uploaded_file, "r") as kmz:
-            kml_name = [f for f in kmz.namelist() if f.endswith(".kml")][0]
-            kml_data = kmz.read(kml_name)
-    else:
-        kml_data = uploaded_file.read()
-
-    root = ET.fromstring(kml_data)
-    ns = {"kml": "http://www.opengis.net/kml/2.2"}
-
-    records = []
-    counter = 1
-
-    for placemark in root.findall(".//kml:Placemark", ns):
-        desc = placemark.findtext("kml:description", "", ns)
-
-        square, sign = "", ""
-
-        # ===== استخراج من Description (الطريقة القديمة) =====
-        if desc:
-            soup = BeautifulSoup(desc, "html.parser")
-            tds = [td.get_text(strip=True) for td in soup.find_all("td")]
-            for i in range(len(tds)):
-                if tds[i] == "رقم المربع":
-                    square = tds[i + 1]
-                if tds[i] == "رقم الشاخص":
-                    sign = tds[i + 1]
-
-        # ===== استخراج من ExtendedData (الطريقة الجديدة) =====
-        extended_data = placemark.find("kml:ExtendedData", ns)
-        if extended_data is not None:
-            for data in extended_data.findall("kml:Data", ns):
-                name = data.get("name")
-                value = data.findtext("kml:value", "", ns)
-                if name == "square_number":
-                    square = value
-                elif name == "sign_number":
-                    sign = value
-
-        for poly in placemark.findall(".//kml:Polygon", ns):
-            coords_text = poly.findtext(".//kml:coordinates", "", ns).strip()
-            coords = []
-
-            for c in coords_text.split():
-                lon, lat, *_ = c.split(",")
-                coords.append((float(lon), float(lat)))
-
-            polygon_shape = Polygon(coords)
-            
-            # حساب المساحة بالمتر المربع
-            area = calculate_area_in_sqm(polygon_shape)
-            
-            # حساب نقطة المنتصف
-            centroid = polygon_shape.centroid
-            center_coords = (centroid.x, centroid.y)
-
-            records.append({
-                "polygon_id": counter,
-                "square_number": square,
-                "sign_number": sign,
-                "coordinates": coords,
-                "polygon": polygon_shape,
-                "Area": area,
-                "Center": center_coords
-            })
-            counter += 1
-
-    df = pd.DataFrame(records)
-    spatial_index = STRtree(df["polygon"].tolist())
-    return df, spatial_index
-
-
-def load_polygons_from_excel(uploaded_excel):
-    """تحميل زونات من Excel"""
-    df = pd.read_excel(uploaded_excel)
-    
-    # التأكد من وجود العواميد الأساسية
-    required_cols = ["polygon_id", "square_number", "sign_number", "coordinates"]
-    for col in required_cols:
-        if col not in df.columns:
-            st.error(f"العامود {col} مفقود في ملف Excel")
-            return None, None
-    
-    # تحويل coordinates من JSON إلى list
-    df["coordinates"] = df["coordinates"].apply(json.loads)
-    df["polygon"] = df["coordinates"].apply(lambda c: Polygon(c))
-    
-    # حساب Area إذا كانت فارغة أو غير موجودة
-    if "Area" not in df.columns or df["Area"].isna().any():
-        df["Area"] = df["polygon"].apply(calculate_area_in_sqm)
-    
-    # حساب Center إذا كانت فارغة أو غير موجودة
-    if "Center" not in df.columns or df["Center"].isna().any():
-        df["Center"] = df["polygon"].apply(lambda p: (p.centroid.x, p.centroid.y))
-    else:
-        # تحويل Center من string إلى tuple إذا كانت موجودة
-        df["Center"] = df["Center"].apply(lambda c: json.loads(c) if isinstance(c, str) else c)
-    
-    spatial_index = STRtree(df["polygon"].tolist())
-    return df, spatial_index
-
-
-def find_point(point, df, spatial_index):
-    """إيجاد الزونات التي تحتوي نقطة"""
-    results = []
-    for idx in spatial_index.query(point):
-        poly = df.iloc[idx]["polygon"]
-        if poly.covers(point):
-            row = df.iloc[idx]
-            results.append({
-                "polygon_id": int(row["polygon_id"]),
-                "square_number": row["square_number"],
-                "sign_number": row["sign_number"]
-            })
-    return results
-
-def compare_zone_data(point_square, point_sign, zone_data):
-    """مقارنة بيانات النقطة مع بيانات الزون"""
-    if not zone_data:  # لا يوجد زونات
-        return None, None, 4
-    
-    zone = zone_data[0]  # نأخذ أول زون (في حالة تعدد الزونات)
-    zone_square = zone.get("square_number", "")
-    zone_sign = zone.get("sign_number", "")
-    
-    cmp_sign = "T" if str(point_sign) == str(zone_sign) else "F"
-    cmp_square = "T" if str(point_square) == str(zone_square) else "F"
-    
-    # تحديد CMP_Result
-    if cmp_sign == "T":
-        cmp_result = 1
-    elif cmp_square == "T" and cmp_sign == "F":
-        cmp_result = 2
-    elif cmp_square == "F":
-        cmp_result = 3
-    else:
-        cmp_result = 3
-    
-    return cmp_sign, cmp_square, cmp_result
-
-
-def find_nearest_zone(point, df):
-    """إيجاد أقرب زون بناء على نقطة المنتصف"""
-    min_dist = float('inf')
-    nearest_zone = None
-    
-    for _, row in df.iterrows():
-        center = Point(row["Center"])
-        dist = calculate_distance_in_meters(point, center)
-        if dist < min_dist:
-            min_dist = dist
-            nearest_zone = {
-                "distance_meters": round(dist, 2),
-                "polygon_id": int(row["polygon_id"]),
-                "square_number": row["square_number"],
-                "sign_number": row["sign_number"]
-            }
-    
-    return nearest_zone
-
-def export_kml_z(df, fill_alpha):
-    doc = Document()
-
-    kml = doc.createElement("kml")
-    kml.setAttribute("xmlns", "http://www.opengis.net/kml/2.2")
-    doc.appendChild(kml)
-
-    document = doc.createElement("Document")
-    kml.appendChild(document)
-
-    for _, row in df.iterrows():
-        placemark = doc.createElement("Placemark")
-
-        # ===== الاسم =====
-        name = doc.createElement("name")
-        name.appendChild(doc.createTextNode(f"Polygon {row['polygon_id']}"))
-        placemark.appendChild(name)
-
-        # ===== الوصف =====
-        # desc = doc.createElement("description")
-        # desc.appendChild(
-        #     doc.createTextNode(
-        #         f"Square: {row['square_number']} | Sign: {row['sign_number']} | Area: {row['Area']:.2f} m²"
-        #     )
-        # )
-        # placemark.appendChild(desc)
-
-        # ===== ExtendedData =====
-        extended_data = doc.createElement("ExtendedData")
-        
-        for field, value in [("square_number", row['square_number']), 
-                             ("sign_number", row['sign_number']),
-                             ("Area_sqm", f"{row['Area']:.2f}")]:
-            data = doc.createElement("Data")
-            data.setAttribute("name", field)
-            val = doc.createElement("value")
-            val.appendChild(doc.createTextNode(str(value)))
-            data.appendChild(val)
-            extended_data.appendChild(data)
-        
-        placemark.appendChild(extended_data)
-
-        # ===== النمط =====
-        fill, line = random_kml_color(fill_alpha, "FF")
 
-        style = doc.createElement("Style")
+# عدد تقارير الأداء المحفوظة في الجلسة (الأقدم يُحذف)
+PERF_JOBS_KEEP = 20
 
-        line_style = doc.createElement("LineStyle")
-        lc = doc.createElement("color")
-        lc.appendChild(doc.createTextNode(line))
-        lw = doc.createElement("width")
-        lw.appendChild(doc.createTextNode("2"))
-        line_style.appendChild(lc)
-        line_style.appendChild(lw)
 
-        poly_style = doc.createElement("PolyStyle")
-        pc = doc.createElement("color")
-        pc.appendChild(doc.createTextNode(fill))
-        poly_style.appendChild(pc)
-
-        style.appendChild(line_style)
-        style.appendChild(poly_style)
-        placemark.appendChild(style)
-
-        # ===== Polygon =====
-        polygon = doc.createElement("Polygon")
-
-        outer = doc.createElement("outerBoundaryIs")
-        ring = doc.createElement("LinearRing")
-        coords = doc.createElement("coordinates")
-
-        coord_text = " ".join(
-            f"{lon},{lat},0"
-            for lon, lat in row["polygon"].exterior.coords
-        )
+# ======================================================
+# تقدم وإلغاء المهام الطويلة وقياس أدائها
+# ======================================================
+def _set_job_cancelled(name, token):
+    """token المهمة الملغاة (None = لا إلغاء)"""
+    st.session_state[f"job_cancelled_{name}"] = token
+
+
+def job_cancelled(name, token):
+    """هل ألغى المستخدم المهمة name لنفس المدخلات token (مع زر إعادة التشغيل)
+
+    المهام التي تعمل تلقائياً عند رفع ملف لا تُعاد بعد الإلغاء حتى يطلب المستخدم ذلك
+    أو تتغير المدخلات.
+    """
+    if st.session_state.get(f"job_cancelled_{name}") != token:
+        return False
+    st.warning("⏹️ تم إلغاء المهمة")
+    st.button("▶️ إعادة التشغيل", key=f"restart_{name}",
+              on_click=_set_job_cancelled, args=(name, None))
+    return True
+
+
+@contextmanager
+def run_job(name, label, token=None):
+    """JobMonitor مع شريط تقدم وزر إلغاء، وتقرير الأداء يُحفظ في الجلسة
+
+    الضغط على "إلغاء" يوقف التشغيل الحالي (Streamlit يعيد تشغيل السكربت عند
+    أول تحديث لشريط التقدم) ويسجل الإلغاء لـ token حتى لا تبدأ المهمة من جديد.
+    """
+    placeholder = st.empty()
+    with placeholder.container():
+        bar = st.progress(0.0, text=label)
+        st.button("⏹️ إلغاء", key=f"cancel_{name}",
+                  on_click=_set_job_cancelled, args=(name, token))
+
+    def on_progress(stage, done, total):
+        if total:
+            bar.progress(min(done / total, 1.0), text=f"{label} – {stage}: {done:,} / {total:,}")
+        else:
+            bar.progress(0.0, text=f"{label} – {stage}: {done:,}")
+
+    monitor = JobMonitor(name, progress=on_progress)
+    try:
+        yield monitor
+    finally:
+        # التقرير يُحفظ قبل أي استدعاء لـ Streamlit (قد يُرفع الإيقاف مرة أخرى)
+        jobs = st.session_state.setdefault("perf_jobs", [])
+        jobs.append(monitor.report())
+        del jobs[:-PERF_JOBS_KEEP]
+        placeholder.empty()
+
+
+@st.cache_resource
+def shared_zone_cache():
+    """ذاكرة مؤقتة واحدة لكل السيرفر، تبقى بين إعادة التشغيل (rerun) والمستخدمين"""
+    return ZoneLayerCache(ZONE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def load_zone_layer_cached(loader, uploaded_file, *args):
+    """تحميل طبقة زونات مرة واحدة لكل محتوى ملف (مفتاح = بصمة المحتوى + الإعدادات)
+
+    ترجع (None, None) إذا ألغى المستخدم التحميل.
+    """
+    key = (loader.__name__, file_sha256(uploaded_file), args)
+
+    def load():
+        # التقدم والإلغاء عند القراءة الفعلية فقط (ليس عند الإرجاع من الذاكرة)
+        if job_cancelled("load_zones", key):
+            raise JobCancelled()
+        with run_job("load_zones", "⏳ تحميل الزونات", key) as monitor:
+            with monitor.stage(loader.__name__) as stage:
+                if loader is parse_kmz_or_kml:
+                    layer = loader(uploaded_file, *args, monitor=monitor)
+                else:
+                    layer = loader(uploaded_file, *args)
+                stage["items"] = len(layer[0])
+        if ZONE_GRID_M > 0:
+            # يُبنى مرة واحدة عند أول بحث ويبقى مع الطبقة في الذاكرة المشتركة؛
+            # يُفعّل قبل الحفظ حتى يُحسب حده الأقصى ضمن حجم الذاكرة المؤقتة
+            layer[1].enable_grid(ZONE_GRID_M, ZONE_GRID_MB * 1024 * 1024)
+        return layer
+
+    try:
+        return shared_zone_cache().get_or_load(key, load)
+    except JobCancelled:
+        return None, None
 
-        coords.appendChild(doc.createTextNode(coord_text))
-        ring.appendChild(coords)
-        outer.appendChild(ring)
-        polygon.appendChild(outer)
 
-        placemark.appendChild(polygon)
-        document.appendChild(placemark)
+# ======================================================
+# تحميل الجداول (xlsx / csv / parquet)
+# ======================================================
+def table_download(df, file_stem, label, key, writer=write_points_table):
+    """زر تحميل جدول بصيغة يختارها المستخدم (الافتراضي حسب عدد الصفوف)
+
+    الملف يُولّد مرة واحدة لكل جدول وصيغة ويُحفظ في الجلسة حتى يتغير الجدول.
+    """
+    file_format = st.radio(
+        "صيغة الملف:",
+        POINT_FILE_TYPES,
+        index=POINT_FILE_TYPES.index(auto_table_format(len(df))),
+        horizontal=True,
+        key=f"{key}_format"
+    )
+    stored = st.session_state.get(f"{key}_data")
+    if stored is None or stored[0] is not df or stored[1] != file_format:
+        buffer = io.BytesIO()
+        with run_job(key, "⏳ تجهيز الملف") as monitor, monitor.stage(file_format, len(df)):
+            writer(df, buffer, file_format, monitor=monitor)
+        stored = (df, file_format, buffer.getvalue())
+        st.session_state[f"{key}_data"] = stored
+    st.download_button(
+        label,
+        data=stored[2],
+        file_name=f"{file_stem}.{file_format}",
+        mime=TABLE_MIME_TYPES[file_format],
+        key=key
+    )
 
-    return doc.toprettyxml(indent="  ")
-
-def export_points_to_kml(df_points):
-    """تصدير النقاط إلى ملف KML"""
-    kml = []
-    kml.append('<?xml version="1.0" encoding="UTF-8"?>')
-    kml.append('<kml xmlns="http://www.opengis.net/kml/2.2">')
-    kml.append('<Document>')
-    kml.append('  <name>Test Points Results</name>')
-    kml.append('  <description>Points tested against zones</description>')
-    
-    # Styles حسب CMP_Result
-    # Style للنقاط الصحيحة (CMP_Result = 1)
-    kml.append('  <Style id="greenPin">')
-    kml.append('    <IconStyle>')
-    kml.append('      <color>ff00ff00</color>')
-    kml.append('      <scale>1.2</scale>')
-    kml.append('      <Icon>')
-    kml.append('        <href>http://maps.google.com/mapfiles/kml/paddle/grn-circle.png</href>')
-    kml.append('      </Icon>')
-    kml.append('    </IconStyle>')
-    kml.append('  </Style>')
-    
-    # Style للنقاط الخاطئة جزئياً (CMP_Result = 2)
-    kml.append('  <Style id="yellowPin">')
-    kml.append('    <IconStyle>')
-    kml.append('      <color>ff00ffff</color>')
-    kml.append('      <scale>1.2</scale>')
-    kml.append('      <Icon>')
-    kml.append('        <href>http://maps.google.com/mapfiles/kml/paddle/ylw-circle.png</href>')
-    kml.append('      </Icon>')
-    kml.append('    </IconStyle>')
-    kml.append('  </Style>')
-    
-    # Style للنقاط الخاطئة (CMP_Result = 3)
-    kml.append('  <Style id="orangePin">')
-    kml.append('    <IconStyle>')
-    kml.append('      <color>ff0080ff</color>')
-    kml.append('      <scale>1.2</scale>')
-    kml.append('      <Icon>')
-    kml.append('        <href>http://maps.google.com/mapfiles/kml/paddle/orange-circle.png</href>')
-    kml.append('      </Icon>')
-    kml.append('    </IconStyle>')
-    kml.append('  </Style>')
-    
-    # Style للنقاط خارج الزونات (CMP_Result = 4)
-    kml.append('  <Style id="redPin">')
-    kml.append('    <IconStyle>')
-    kml.append('      <color>ff0000ff</color>')
-    kml.append('      <scale>1.2</scale>')
-    kml.append('      <Icon>')
-    kml.append('        <href>http://maps.google.com/mapfiles/kml/paddle/red-circle.png</href>')
-    kml.append('      </Icon>')
-    kml.append('    </IconStyle>')
-    kml.append('  </Style>')
-    
-    # تجميع النقاط حسب CMP_Result
-    if 'CMP_Result' in df_points.columns:
-        result_groups = {
-            1: 'Correct Match (Sign)',
-            2: 'Partial Match (Square Only)',
-            3: 'No Match',
-            4: 'Outside All Zones'
-        }
-        
-        for result_num, result_name in result_groups.items():
-            df_group = df_points[df_points['CMP_Result'] == result_num]
-            
-            if len(df_group) > 0:
-                kml.append(f'  <Folder><name>{result_name} ({len(df_group)} points)</name>')
-                
-                for _, row in df_group.iterrows():
-                    point_id = row.get('id', 'Unknown')
-                    lat = row['lat']
-                    lon = row['lon']
-                    location_type = row.get('location_type', '')
-                    square_number = row.get('square_number', '')
-                    sign_number = row.get('sign_number', '')
-                    polygons_count = row.get('polygons_count', 0)
-                    
-                    # تحديد اللون حسب CMP_Result
-                    style_map = {1: 'greenPin', 2: 'yellowPin', 3: 'orangePin', 4: 'redPin'}
-                    style = style_map.get(result_num, 'redPin')
-                    
-                    # إنشاء الوصف
-                    desc_parts = [
-                        f"ID: {point_id}",
-                        f"Location Type: {location_type}",
-                        f"Square: {square_number}",
-                        f"Sign: {sign_number}",
-                        f"Zones Count: {polygons_count}",
-                        f"CMP Result: {result_num}"
-                    ]
-                    
-                    if 'CMP_square' in row and row['CMP_square']:
-                        desc_parts.append(f"CMP Square: {row['CMP_square']}")
-                    if 'CMP_sign' in row and row['CMP_sign']:
-                        desc_parts.append(f"CMP Sign: {row['CMP_sign']}")
-                    
-                    desc = "<br>".join(desc_parts)
-                    
-                    kml.append('      <Placemark>')
-                    kml.append(f'        <name>Point {point_id}</name>')
-                    kml.append(f'        <description><![CDATA[{desc}]]></description>')
-                    kml.append(f'        <styleUrl>#{style}</styleUrl>')
-                    kml.append('        <Point>')
-                    kml.append(f'          <coordinates>{lon},{lat},0</coordinates>')
-                    kml.append('        </Point>')
-                    kml.append('      </Placemark>')
-                
-                kml.append('  </Folder>')
-    else:
-        # إذا لم يكن هناك CMP_Result، نصدر كل النقاط بدون تصنيف
-        kml.append('  <Folder><name>All Points</name>')
-        
-        for _, row in df_points.iterrows():
-            point_id = row.get('id', 'Unknown')
-            lat = row['lat']
-            lon = row['lon']
-            
-            kml.append('      <Placemark>')
-            kml.append(f'        <name>Point {point_id}</name>')
-            kml.append('        <Point>')
-            kml.append(f'          <coordinates>{lon},{lat},0</coordinates>')
-            kml.append('        </Point>')
-            kml.append('      </Placemark>')
-        
-        kml.append('  </Folder>')
-    
-    kml.append('</Document>')
-    kml.append('</kml>')
-    
-    return "\n".join(kml)
 
 # ======================================================
 # الواجهة – اختيار مصدر الزونات
@@ -476,11 +201,17 @@ st.subheader("🗂️ مصدر الزونات")
 
 source = st.radio(
     "اختر طريقة إدخال الزونات:",
-    ["KMZ / KML", "Excel"]
+    ["KMZ / KML", "Excel", "ملف زونات مُجمّع"]
+)
+
+accurate_area = st.checkbox(
+    "حساب دقيق للمساحة (إسقاط متساوي المساحة، أبطأ قليلاً)",
+    value=False
 )
 
 df_polygons = None
 spatial_index = None
+zones_file = None
 
 
 # ======================================================
@@ -495,25 +226,22 @@ polygon_id | square_number | sign_number | coordinates | Area | Center
 
     uploaded_excel = st.file_uploader("📂 ارفع ملف Excel للزونات", type=["xlsx"])
     if uploaded_excel:
-        df_polygons, spatial_index = load_polygons_from_excel(uploaded_excel)
+        zones_file = uploaded_excel
+        try:
+            df_polygons, spatial_index = load_zone_layer_cached(
+                load_polygons_from_excel, uploaded_excel, accurate_area
+            )
+        except ValueError as e:
+            st.error(str(e))
+            zones_file = None
         
         if df_polygons is not None:
             st.success(f"تم تحميل {len(df_polygons)} زون")
             
-            # تصدير Excel بعد إضافة Area و Center
-            export_df = df_polygons.drop(columns=["polygon"]).copy()
-            export_df["coordinates"] = export_df["coordinates"].apply(json.dumps)
-            export_df["Center"] = export_df["Center"].apply(json.dumps)
-            
-            buffer = io.BytesIO()
-            export_df.to_excel(buffer, index=False)
-            buffer.seek(0)
-            
-            st.download_button(
-                "📥 تحميل الزونات المحدّثة كـ Excel",
-                data=buffer,
-                file_name="polygons_updated.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            # تصدير الجدول بعد إضافة Area و Center
+            table_download(
+                df_polygons, "polygons_updated", "📥 تحميل الزونات المحدّثة",
+                "download_zones_table", writer=write_zones_table
             )
 
 # ======================================================
@@ -526,23 +254,159 @@ if source == "KMZ / KML":
     )
 
     if uploaded_file:
-        df_polygons, spatial_index = parse_kmz_or_kml(uploaded_file)
+        zones_file = uploaded_file
+        df_polygons, spatial_index = load_zone_layer_cached(
+            parse_kmz_or_kml, uploaded_file, accurate_area
+        )
+
+    if df_polygons is not None:
         st.success(f"تم تحميل {len(df_polygons)} زون")
 
-        export_df = df_polygons.drop(columns=["polygon"]).copy()
-        export_df["coordinates"] = export_df["coordinates"].apply(json.dumps)
-        export_df["Center"] = export_df["Center"].apply(json.dumps)  # إضافة هذا السطر
+        parse_stats = df_polygons.attrs.get("parse_stats", {})
+        if parse_stats.get("soup_fallbacks"):
+            st.caption(
+                f"احتاج {parse_stats['soup_fallbacks']} من {parse_stats['descriptions']} "
+                "وصف إلى BeautifulSoup"
+            )
 
-        buffer = io.BytesIO()
-        export_df.to_excel(buffer, index=False)
-        buffer.seek(0)
+        table_download(
+            df_polygons, "polygons", "📥 تحميل الزونات كجدول",
+            "download_zones_table", writer=write_zones_table
+        )
 
+# ======================================================
+# خيار ملف زونات مُجمّع (Parquet)
+# ======================================================
+if source == "ملف زونات مُجمّع":
+    uploaded_compiled = st.file_uploader(
+        "📂 ارفع ملف الزونات المُجمّع",
+        type=["parquet"]
+    )
+
+    if uploaded_compiled:
+        try:
+            df_polygons, spatial_index = load_zone_layer_cached(
+                load_compiled_zones, uploaded_compiled
+            )
+        except ValueError as e:
+            st.error(str(e))
+        if df_polygons is not None:
+            meta = df_polygons.attrs["source"]
+            st.success(f"تم تحميل {len(df_polygons)} زون")
+            st.caption(f"المصدر: {meta['source_name']} | تاريخ التجميع: {meta['created']}")
+
+# ======================================================
+# تجميع الزونات لتحميل أسرع لاحقاً
+# ======================================================
+if df_polygons is not None and zones_file is not None:
+    if st.button("⚙️ تجميع الزونات (Parquet) لتحميل أسرع"):
+        compiled = io.BytesIO()
+        compile_zones(
+            df_polygons,
+            compiled,
+            source_name=zones_file.name,
+            source_sha256=file_sha256(zones_file)
+        )
         st.download_button(
-            "📥 تحميل الزونات كـ Excel",
-            data=buffer,
-            file_name="polygons.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            "📥 تحميل zones.parquet",
+            data=compiled.getvalue(),
+            file_name=f"{os.path.splitext(zones_file.name)[0]}.zones.parquet",
+            mime="application/octet-stream",
+            key="download_zones_parquet"
+        )
+
+# ======================================================
+# تعديل الزونات (بدون إعادة رفع الطبقة كاملة)
+# ======================================================
+if df_polygons is not None:
+    # الطبقة الأصلية مشتركة بين المستخدمين، والتعديلات خاصة بكل جلسة
+    stored = st.session_state.get("zone_store")
+    if stored is None or stored[0] is not df_polygons:
+        stored = (df_polygons, ZoneStore(df_polygons, spatial_index, accurate_area))
+        st.session_state["zone_store"] = stored
+    zone_store = stored[1]
+
+    with st.expander("✏️ تعديل الزونات (إضافة / تعديل / حذف حسب polygon_id)"):
+        changes_file = st.file_uploader(
+            "ملف التعديلات (polygon_id, action, square_number, sign_number, coordinates) أو KML",
+            type=list(ZONE_CHANGE_FILE_TYPES),
+            key="zone_changes_file"
         )
+        if changes_file and st.button("تطبيق التعديلات"):
+            try:
+                summary = zone_store.apply(load_zone_changes(changes_file))
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(
+                    f"تمت إضافة {summary['added']} وتعديل {summary['modified']} "
+                    f"وحذف {summary['deleted']} زون"
+                )
+        if zone_store.pending_changes:
+            st.caption(f"تعديلات غير مدمجة في الفهرس: {zone_store.pending_changes}")
+
+    df_polygons, spatial_index = zone_store.layer()
+
+# ======================================================
+# فحص جودة طبقة الزونات
+# ======================================================
+if df_polygons is not None:
+    with st.expander("🧪 فحص جودة الزونات (تداخل / فجوات / بوليقونات غير صالحة / تكرار)"):
+        min_area = st.number_input(
+            "أقل مساحة للتداخل أو الفجوة (متر مربع)", 0.0, 1e6, DEFAULT_MIN_AREA_SQM, step=1.0
+        )
+        if st.button("تشغيل الفحص"):
+            with st.spinner("جاري فحص الطبقة..."):
+                st.session_state["zone_qa"] = (
+                    df_polygons, zone_qa_report(df_polygons, spatial_index, min_area_sqm=min_area)
+                )
+
+        stored_qa = st.session_state.get("zone_qa")
+        # التقرير يخص الطبقة التي فُحصت فقط
+        if stored_qa is not None and stored_qa[0] is df_polygons:
+            report = stored_qa[1]
+            st.dataframe(report["summary"], hide_index=True)
+            for key, title in (("overlaps", "التداخل"), ("invalid", "بوليقونات غير صالحة"),
+                               ("duplicates", "تكرار رقم المربع والشاخص"), ("gaps", "الفجوات")):
+                if len(report[key]):
+                    st.markdown(f"**{title}** ({len(report[key])})")
+                    st.dataframe(report[key].drop(columns=["geometry"], errors="ignore"), hide_index=True)
+
+            qa_col1, qa_col2 = st.columns(2)
+            with qa_col1:
+                qa_buffer = io.BytesIO()
+                write_qa_excel(report, qa_buffer)
+                st.download_button(
+                    "📥 تحميل zone_qa.xlsx",
+                    data=qa_buffer.getvalue(),
+                    file_name="zone_qa.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="download_zone_qa_xlsx"
+                )
+            with qa_col2:
+                qa_buffer = io.BytesIO()
+                write_qa_kml(report, qa_buffer, kmz=True)
+                st.download_button(
+                    "📥 تحميل zone_qa.kmz",
+                    data=qa_buffer.getvalue(),
+                    file_name="zone_qa.kmz",
+                    mime="application/vnd.google-earth.kmz",
+                    key="download_zone_qa_kmz"
+                )
+
+            if len(report["invalid"]) and st.button("إصلاح البوليقونات غير الصالحة"):
+                # الإصلاح يُطبق كتعديلات على الجلسة (نفس مسار ملف التعديلات)
+                repaired, _ = repair_invalid_zones(df_polygons, accurate_area)
+                ids = report["invalid"]["polygon_id"]
+                changes = repaired.loc[repaired["polygon_id"].isin(ids),
+                                       ["polygon_id", "square_number", "sign_number"]]
+                changes.insert(1, "action", "modify")
+                changes["coordinates"] = polygon_coordinates(
+                    repaired.loc[changes.index, "polygon"].tolist()
+                )
+                zone_store.apply(changes.reset_index(drop=True))
+                df_polygons, spatial_index = zone_store.layer()
+                st.success(f"تم إصلاح {len(changes)} بوليقون")
 
 # ======================================================
 # باقي الخطوات (مشتركة)
@@ -559,122 +423,174 @@ if df_polygons is not None:
         
     st.divider() 
     st.subheader("📊 اختبار ملف نقاط Excel")
-    excel_points = st.file_uploader("ارفع ملف Excel (location_type, id, lat, lon, square_number, sign_number)", type=["xlsx"])
-
-    out_df = None  # إضافة هذا السطر في البداية
-    
-    if excel_points:
-        points_df = pd.read_excel(excel_points)
-        
-        # التأكد من وجود العواميد المطلوبة
-        if "square_number" not in points_df.columns:
-            points_df["square_number"] = ""
-        if "sign_number" not in points_df.columns:
-            points_df["sign_number"] = ""
-        
-        results = []
-
-        for _, r in points_df.iterrows():
-            p = Point(r["lon"], r["lat"])
-            matches = find_point(p, df_polygons, spatial_index)
-            
-            # المقارنة
-            cmp_sign, cmp_square, cmp_result = compare_zone_data(
-                r.get("square_number", ""),
-                r.get("sign_number", ""),
-                matches
+    excel_points = st.file_uploader("ارفع ملف Excel (location_type, id, lat, lon, square_number, sign_number)", type=list(POINT_FILE_TYPES))
+    parallel = st.checkbox("⚡ معالجة متوازية على دفعات (للملفات الكبيرة جداً)")
+
+    # اختيار الزون عند وقوع النقطة في أكثر من زون (يحدد CMP_Result وأول زون في result)
+    zone_policy = st.selectbox(
+        "الزون المعتمد عند التداخل:",
+        ZONE_POLICIES,
+        format_func=lambda p: {
+            "first": "الأول في الطبقة",
+            "match": "الزون المطابق لـ sign ثم square",
+            "smallest": "الأصغر مساحة",
+            "priority": "حسب عامود الأولوية (الأصغر أولاً)"
+        }[p]
+    )
+    priority_column = DEFAULT_PRIORITY_COLUMN
+    priority_missing = False
+    if zone_policy == "priority":
+        extra_columns = [
+            c for c in df_polygons.columns
+            if c not in ("polygon_id", "square_number", "sign_number", "polygon", "Area", "Center")
+        ]
+        if not extra_columns:
+            st.error("طبقة الزونات لا تحتوي على عامود أولوية (أضفه كعامود في ملف Excel للزونات)")
+            priority_missing = True
+        else:
+            priority_column = st.selectbox(
+                "عامود الأولوية:", extra_columns,
+                index=extra_columns.index(DEFAULT_PRIORITY_COLUMN)
+                if DEFAULT_PRIORITY_COLUMN in extra_columns else 0
+            )
+    explode = st.checkbox("صف لكل (نقطة، زون) بدل صف واحد لكل نقطة")
+    tolerance_m = st.number_input(
+        "تسامح حدود الزون (متر)", 0.0, 1000.0, 0.0, step=1.0,
+        help="النقاط خارج الزونات على هذه المسافة أو أقل من حدود زون تأخذ CMP_Result = 5"
+    )
+    test_options = {
+        "policy": zone_policy,
+        "priority_column": priority_column,
+        "explode": explode,
+        "tolerance_m": tolerance_m
+    }
+
+    out_df = None
+    
+    if priority_missing:
+        pass
+    elif excel_points and parallel:
+        out_format = st.radio("صيغة ملف النتائج:", ["parquet", "csv"], horizontal=True)
+
+        points_key = (file_sha256(excel_points), tuple(test_options.values()))
+        if st.button("🚀 تشغيل المعالجة المتوازية"):
+            with run_job("points_pipeline", "⏳ فحص النقاط على دفعات") as monitor:
+                with tempfile.TemporaryDirectory() as tmp:
+                    out_path = os.path.join(tmp, f"points_result.{out_format}")
+                    with monitor.stage("pipeline") as stage:
+                        summary = run_points_pipeline(
+                            excel_points, df_polygons, out_path,
+                            grid_cell_m=ZONE_GRID_M or None,
+                            grid_max_bytes=ZONE_GRID_MB * 1024 * 1024,
+                            monitor=monitor,
+                            **test_options
+                        )
+                        stage["items"] = summary["rows"]
+                    with open(out_path, "rb") as f:
+                        result_bytes = f.read()
+            st.session_state["points_pipeline"] = (
+                df_polygons, points_key, out_format, summary, result_bytes
             )
-            
-            # إنشاء السطر مع الحفاظ على جميع البيانات الأصلية
-            result_row = r.to_dict()  # نحتفظ بجميع البيانات الأصلية
-            
-            # إضافة النتائج الجديدة
-            result_row.update({
-                "polygons_count": len(matches),
-                "result": json.dumps(matches, ensure_ascii=False),
-                "CMP_square": cmp_square if cmp_square else "",
-                "CMP_sign": cmp_sign if cmp_sign else "",
-                "CMP_Result": cmp_result
-            })
-            
-            results.append(result_row)
-
-        out_df = pd.DataFrame(results)
-        st.dataframe(out_df)
 
-        buf = io.BytesIO()
-        out_df.to_excel(buf, index=False)
-        buf.seek(0)
+        # النتيجة تبقى بعد إعادة التشغيل (rerun) ما دامت الطبقة وملف النقاط نفسهما
+        stored_pipeline = st.session_state.get("points_pipeline")
+        if (stored_pipeline is not None and stored_pipeline[0] is df_polygons
+                and stored_pipeline[1] == points_key):
+            _, _, result_format, summary, result_bytes = stored_pipeline
+            st.success(
+                f"تم فحص {summary['rows']} نقطة في {summary['chunks']} دفعة "
+                f"على {summary['workers']} أنوية خلال {summary['seconds']} ثانية"
+            )
+            st.download_button(
+                "📥 تحميل نتائج النقاط",
+                data=result_bytes,
+                file_name=f"points_result.{result_format}",
+                mime=TABLE_MIME_TYPES[result_format],
+                key="download_pipeline_result"
+            )
 
-        st.download_button(
-            "📥 تحميل نتائج النقاط",
-            data=buf,
-            file_name="points_result.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    elif excel_points:
+        # النتائج محفوظة في الجلسة حسب الطبقة وبصمة ملف النقاط والإعدادات،
+        # ولا تُعاد إلا عند تغيّر أحدها
+        points_key = (file_sha256(excel_points), tuple(test_options.values()))
+        stored_points = st.session_state.get("points_result")
+        if ((stored_points is None or stored_points[0] is not df_polygons
+                or stored_points[1] != points_key)
+                and not job_cancelled("points_test", points_key)):
+            with run_job("points_test", "⏳ فحص النقاط", points_key) as monitor:
+                with monitor.stage("read_points") as stage:
+                    points_df = read_points_table(excel_points)
+                    stage["items"] = len(points_df)
+                with monitor.stage("point_test", len(points_df)):
+                    stored_points = (
+                        df_polygons, points_key,
+                        run_points_test(
+                            points_df, df_polygons, spatial_index, monitor, **test_options
+                        )
+                    )
+            st.session_state["points_result"] = stored_points
+        if (stored_points is not None and stored_points[0] is df_polygons
+                and stored_points[1] == points_key):
+            out_df = stored_points[2]
+            st.dataframe(out_df)
+
+            table_download(out_df, "points_result", "📥 تحميل نتائج النقاط", "download_points_result")
     
     st.divider()
     st.subheader("🔍 إيجاد أقرب زون للنقاط (3 و 4)")
-    st.info("هذا القسم يعمل على ملف النتائج السابق ويجد أقرب زون للنقاط ذات CMP_Result = 3 أو 4")
+    st.info("هذا القسم يعمل على نتائج الفحص السابق ويجد أقرب زون للنقاط ذات CMP_Result = 3 أو 4")
     
-    excel_results = st.file_uploader("ارفع ملف نتائج النقاط (points_result.xlsx)", type=["xlsx"], key="nearest_zone_file")
+    excel_results = st.file_uploader(
+        "ملف نتائج نقاط سابق (اختياري، بدونه تُستخدم نتائج الفحص أعلاه)",
+        type=list(POINT_FILE_TYPES),
+        key="nearest_zone_file"
+    )
 
+    results_df = None
     if excel_results:
-        results_df = pd.read_excel(excel_results)
-        
+        results_key = file_sha256(excel_results)
+        stored_results = st.session_state.get("uploaded_points_result")
+        if stored_results is None or stored_results[0] != results_key:
+            stored_results = (results_key, read_points_table(excel_results))
+            st.session_state["uploaded_points_result"] = stored_results
+        results_df = stored_results[1]
+    elif out_df is not None:
+        results_df = out_df
+
+    if results_df is not None:
         if "CMP_Result" not in results_df.columns:
             st.error("الملف المرفوع لا يحتوي على عامود CMP_Result. تأكد من رفع ملف النتائج الصحيح.")
         else:
+            nearest_mode = st.radio(
+                "طريقة حساب المسافة:",
+                NEAREST_MODES,
+                format_func=lambda m: {
+                    "center": "إلى نقطة منتصف الزون",
+                    "boundary": "إلى حدود الزون"
+                }[m],
+                horizontal=True
+            )
+
             if st.button("🔎 ابحث عن أقرب زون"):
-                updated_results = []
-                
-                progress_bar = st.progress(0)
-                total = len(results_df)
-                
-                for idx, r in results_df.iterrows():
-                    result_row = r.to_dict()
-                    
-                    # فقط للنقاط ذات CMP_Result = 3 أو 4
-                    if r["CMP_Result"] in [3, 4]:
-                        p = Point(r["lon"], r["lat"])
-                        nearest = find_nearest_zone(p, df_polygons)
-                        if nearest:
-                            result_row["nearest_distance_m"] = nearest["distance_meters"]
-                            result_row["nearest_zone"] = json.dumps(nearest, ensure_ascii=False)
-                        else:
-                            result_row["nearest_distance_m"] = ""
-                            result_row["nearest_zone"] = ""
-                    else:
-                        result_row["nearest_distance_m"] = ""
-                        result_row["nearest_zone"] = ""
-                    
-                    updated_results.append(result_row)
-                    progress_bar.progress((idx + 1) / total)
-                
-                final_df = pd.DataFrame(updated_results)
-                
-                # ترتيب العواميد: نضع nearest_distance_m قبل nearest_zone
-                cols = list(final_df.columns)
-                if "nearest_zone" in cols and "nearest_distance_m" in cols:
-                    # إزالة العمودين من مكانهما
-                    cols.remove("nearest_distance_m")
-                    cols.remove("nearest_zone")
-                    # إضافتهما في النهاية بالترتيب الصحيح
-                    cols.extend(["nearest_distance_m", "nearest_zone"])
-                    final_df = final_df[cols]
-                
+                with run_job("nearest", "⏳ إيجاد أقرب زون") as monitor:
+                    with monitor.stage("nearest", len(results_df)):
+                        st.session_state["nearest_result"] = (
+                            df_polygons, results_df, nearest_mode,
+                            add_nearest_zone_columns(
+                                results_df, df_polygons, spatial_index, nearest_mode, monitor
+                            )
+                        )
+
+            stored_nearest = st.session_state.get("nearest_result")
+            if (stored_nearest is not None and stored_nearest[0] is df_polygons
+                    and stored_nearest[1] is results_df and stored_nearest[2] == nearest_mode):
+                final_df = stored_nearest[3]
                 st.success(f"تم معالجة {len(final_df)} نقطة")
                 st.dataframe(final_df)
                 
-                buf = io.BytesIO()
-                final_df.to_excel(buf, index=False)
-                buf.seek(0)
-                
-                st.download_button(
-                    "📥 تحميل النتائج مع أقرب زون",
-                    data=buf,
-                    file_name="points_with_nearest_zone.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                table_download(
+                    final_df, "points_with_nearest_zone", "📥 تحميل النتائج مع أقرب زون",
+                    "download_nearest_result"
                 )
             
     st.divider()
@@ -685,14 +601,52 @@ if df_polygons is not None:
     with col1:
         st.markdown("#### 📐 تصدير الزونات")
         alpha = st.slider("شفافية داخل الزون", 0, 255, 85)
+        style_mode = st.selectbox(
+            "تلوين الزونات",
+            ZONE_STYLE_MODES,
+            format_func=lambda m: {
+                "inline": "لون عشوائي لكل زون",
+                "square": "لوحة ألوان حسب رقم المربع",
+                "neighbors": "لوحة ألوان مع اختلاف الزونات المتجاورة"
+            }[m]
+        )
+        palette_size = DEFAULT_PALETTE_SIZE
+        if style_mode != "inline":
+            palette_size = st.slider("عدد الألوان في اللوحة", 4, 64, DEFAULT_PALETTE_SIZE)
+        zones_lod = st.checkbox(
+            "KMZ بمستويات تفاصيل (للطبقات الكبيرة)", value=False,
+            help="تبسيط تلقائي حسب التقريب في Google Earth"
+        )
+        simplify_m = 0.0
+        zones_kmz = zones_lod
+        if not zones_lod:
+            simplify_m = st.number_input("تبسيط الإحداثيات (متر)", 0.0, 1000.0, 0.0, step=1.0)
+            zones_kmz = st.checkbox("ضغط الملف كـ KMZ", value=False)
+        zones_ext = "kmz" if zones_kmz else "kml"
         
         if st.button("توليد KML للزونات"):
-            kml_zones = export_kml_z(df_polygons, f"{alpha:02x}")
+            kml_buffer = io.BytesIO()
+            with run_job("zones_kml", "⏳ توليد KML للزونات") as monitor:
+                with monitor.stage(f"zones_{zones_ext}", len(df_polygons)):
+                    if zones_lod:
+                        write_kml_z_lod(
+                            df_polygons, f"{alpha:02x}", kml_buffer,
+                            style_mode=style_mode, palette_size=palette_size,
+                            spatial_index=spatial_index
+                        )
+                    else:
+                        write_kml_z(
+                            df_polygons, f"{alpha:02x}", kml_buffer, kmz=zones_kmz,
+                            style_mode=style_mode, palette_size=palette_size,
+                            spatial_index=spatial_index, simplify_m=simplify_m,
+                            monitor=monitor
+                        )
             st.download_button(
-                "📥 تحميل zones.kml",
-                data=kml_zones,
-                file_name="zones.kml",
-                mime="application/vnd.google-earth.kml+xml",
+                f"📥 تحميل zones.{zones_ext}",
+                data=kml_buffer.getvalue(),
+                file_name=f"zones.{zones_ext}",
+                mime="application/vnd.google-earth.kmz" if zones_kmz
+                else "application/vnd.google-earth.kml+xml",
                 key="download_zones_kml"
             )
     
@@ -701,14 +655,28 @@ if df_polygons is not None:
         # التحقق من وجود بيانات نقاط تم اختبارها
         if out_df is not None and not out_df.empty:
             st.info(f"يوجد {len(out_df)} نقطة جاهزة للتصدير")
+            points_kmz = st.checkbox("ضغط الملف كـ KMZ", value=False, key="points_kmz")
+            folder_limit = None
+            if points_kmz and st.checkbox("تقسيم المجلدات الكبيرة إلى ملفات مرتبطة (NetworkLink)"):
+                folder_limit = st.number_input(
+                    "أقصى عدد نقاط في كل ملف", min_value=1000, value=50000, step=1000
+                )
+            points_ext = "kmz" if points_kmz else "kml"
             
             if st.button("توليد KML للنقاط"):
-                kml_points = export_points_to_kml(out_df)
+                kml_buffer = io.BytesIO()
+                with run_job("points_kml", "⏳ توليد KML للنقاط") as monitor:
+                    with monitor.stage(f"points_{points_ext}", len(out_df)):
+                        write_points_kml(
+                            out_df, kml_buffer, kmz=points_kmz, folder_limit=folder_limit,
+                            monitor=monitor
+                        )
                 st.download_button(
-                    "📥 تحميل test_points.kml",
-                    data=kml_points,
-                    file_name="test_points.kml",
-                    mime="application/vnd.google-earth.kml+xml",
+                    f"📥 تحميل test_points.{points_ext}",
+                    data=kml_buffer.getvalue(),
+                    file_name=f"test_points.{points_ext}",
+                    mime="application/vnd.google-earth.kmz" if points_kmz
+                    else "application/vnd.google-earth.kml+xml",
                     key="download_points_kml"
                 )
         else:
@@ -723,3 +691,23 @@ if df_polygons is not None:
                     mime="application/vnd.google-earth.kml+xml",
                     key="download_points_kml"
                 )
+
+
+# ======================================================
+# الأداء
+# ======================================================
+perf_jobs = st.session_state.get("perf_jobs", [])
+if perf_jobs:
+    with st.expander("⏱️ الأداء (زمن كل مرحلة وأعلى استهلاك للذاكرة)"):
+        st.dataframe([
+            {"job": job["job"], "started": job["started"], **stage}
+            for job in reversed(perf_jobs)
+            for stage in job["stages"]
+        ])
+        st.download_button(
+            "📥 تحميل تقرير الأداء (JSON)",
+            data=json.dumps(perf_jobs, ensure_ascii=False, indent=2),
+            file_name="performance.json",
+            mime="application/json",
+            key="download_perf_json"
+        )
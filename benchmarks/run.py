@@ -0,0 +1,173 @@
+# ======================================================
+# قياس أداء مراحل الأداة على طبقات اصطناعية
+#
+# python -m benchmarks.run --scales 1000 10000 100000 -o bench.json
+# ======================================================
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from kmz_zone_app import (
+    ZoneIndex,
+    build_zone_grid,
+    parse_kmz_or_kml,
+    run_points_test,
+    find_nearest_zones_bulk,
+    write_zones_table,
+    export_kml_z,
+    export_points_to_kml,
+    zone_qa_report,
+    RssSampler
+)
+
+from .synthetic import make_zone_kmz, make_points
+
+
+STAGES = ("parse", "index", "grid", "point_test", "nearest", "excel_export", "kml_export",
+          "points_kml_export", "qa")
+
+
+class _NamedBytes(io.BytesIO):
+    """BytesIO باسم ملف (مثل الملف المرفوع في Streamlit)"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def _measure(fn, repeat):
+    """أفضل زمن من repeat محاولات مع أعلى RSS، وإرجاع نتيجة آخر محاولة"""
+    best = float("inf")
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        with RssSampler() as rss:
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        peak = max(peak, rss.peak)
+    return result, best, peak
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(n_zones, args):
+    """قياس كل المراحل لطبقة بحجم n_zones"""
+    kmz = make_zone_kmz(n_zones, args.vertices, args.metadata)
+    points_df = make_points(n_zones, int(n_zones * args.points_per_zone), args.vertices)
+    runs = []
+
+    def record(stage, items, fn):
+        if stage not in args.stages:
+            return None
+        result, seconds, peak = _measure(fn, args.repeat)
+        runs.append({
+            "scale": n_zones,
+            "stage": stage,
+            "items": items,
+            "seconds": round(seconds, 6),
+            "items_per_s": round(items / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": round(peak / 2**20, 1)
+        })
+        print(f"{n_zones:>8} {stage:<13} {seconds:9.3f}s {items / seconds:14.0f}/s", file=sys.stderr)
+        return result
+
+    layer = record("parse", n_zones, lambda: parse_kmz_or_kml(_NamedBytes(kmz, "zones.kmz")))
+    df, spatial_index = layer or parse_kmz_or_kml(_NamedBytes(kmz, "zones.kmz"))
+
+    # بناء الفهرس فقط: المستطيلات الداخلية تُحسب داخل point_test للزونات المزدحمة
+    record("index", n_zones, lambda: ZoneIndex(df))
+
+    if args.grid_m:
+        record("grid", n_zones, lambda: build_zone_grid(spatial_index, args.grid_m))
+        spatial_index.enable_grid(args.grid_m)
+        spatial_index.grid  # البناء هنا وليس داخل قياس point_test
+
+    n_points = len(points_df)
+    out_df = record("point_test", n_points, lambda: run_points_test(points_df, df, spatial_index))
+    if out_df is None:
+        out_df = run_points_test(points_df, df, spatial_index)
+
+    far = out_df[out_df["CMP_Result"].isin([3, 4])]
+    record("nearest", len(far), lambda: find_nearest_zones_bulk(
+        far["lon"], far["lat"], df, spatial_index, args.nearest_mode
+    ))
+
+    def excel_export():
+        buf = io.BytesIO()
+        # نفس مسار التصدير في التطبيق وسطر الأوامر (xlsx بوضع الكتابة فقط)
+        write_zones_table(df, buf, "xlsx")
+        return buf.tell()
+
+    record("excel_export", n_zones, excel_export)
+    record("kml_export", n_zones, lambda: export_kml_z(df, "55"))
+    record("points_kml_export", n_points, lambda: export_points_to_kml(out_df))
+    record("qa", n_zones, lambda: zone_qa_report(df, spatial_index))
+    return runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="قياس أداء مراحل أداة الزونات")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="أعداد الزونات المطلوب قياسها")
+    parser.add_argument("--vertices", type=int, default=8, help="عدد الرؤوس لكل زون")
+    parser.add_argument("--metadata", choices=["extended", "description"], default="extended")
+    parser.add_argument("--points-per-zone", type=float, default=2.0)
+    parser.add_argument("--nearest-mode", choices=["center", "boundary"], default="center")
+    parser.add_argument("--grid-m", type=float, default=0.0,
+                        help="فحص النقاط مع جدول البحث الشبكي بهذا الحجم للخلية (متر)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="عدد المحاولات (يؤخذ الأفضل)")
+    parser.add_argument("-o", "--output", help="ملف JSON للنتائج (الافتراضي: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "shapely": shapely.__version__,
+            "vertices": args.vertices,
+            "metadata": args.metadata,
+            "points_per_zone": args.points_per_zone,
+            "nearest_mode": args.nearest_mode,
+            "repeat": args.repeat
+        },
+        "runs": []
+    }
+    for n_zones in args.scales:
+        report["runs"].extend(bench_scale(n_zones, args))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+# ======================================================
+# توليد طبقات زونات ونقاط اصطناعية للقياس
+# ======================================================
+import io
+import math
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+# نقطة البداية (مكة تقريباً) وحجم خلية كل زون بالدرجات
+ORIGIN = (39.80, 21.40)
+CELL_DEG = 0.002
+
+
+def _grid_shape(n_zones):
+    cols = max(1, math.ceil(math.sqrt(n_zones)))
+    rows = math.ceil(n_zones / cols)
+    return rows, cols
+
+
+def zone_rings(n_zones, vertices=8, seed=0):
+    """رؤوس زونات مضلعة منتظمة (مع اهتزاز بسيط) داخل شبكة، كمصفوفة (n, vertices, 2)"""
+    rng = np.random.default_rng(seed)
+    _, cols = _grid_shape(n_zones)
+    k = np.arange(n_zones)
+    cx = ORIGIN[0] + (k % cols + 0.5) * CELL_DEG
+    cy = ORIGIN[1] + (k // cols + 0.5) * CELL_DEG
+
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radius = CELL_DEG * 0.45 * rng.uniform(0.9, 1.0, size=(n_zones, vertices))
+    xs = cx[:, None] + radius * np.cos(angles)
+    ys = cy[:, None] + radius * np.sin(angles)
+    return np.stack([xs, ys], axis=-1)
+
+
+def zone_labels(n_zones):
+    """أرقام المربع والشاخص لكل زون"""
+    k = np.arange(1, n_zones + 1)
+    squares = [f"{i % 97}A" for i in k]
+    signs = [f"{i % 7}/{i}" for i in k]
+    return squares, signs
+
+
+def make_zone_kml(n_zones, vertices=8, metadata="extended", seed=0):
+    """ملف KML اصطناعي (bytes) بـ n_zones زون
+
+    metadata="extended": رقم المربع/الشاخص في ExtendedData
+    metadata="description": رقم المربع/الشاخص في جدول HTML داخل description
+    """
+    rings = zone_rings(n_zones, vertices, seed)
+    squares, signs = zone_labels(n_zones)
+
+    out = io.StringIO()
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write('<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+    for i in range(n_zones):
+        ring = np.vstack([rings[i], rings[i][:1]])
+        coords = " ".join(f"{x:.7f},{y:.7f},0" for x, y in ring)
+        if metadata == "description":
+            meta = (
+                "<description><![CDATA[<table>"
+                f"<tr><td>رقم المربع</td><td>{squares[i]}</td></tr>"
+                f"<tr><td>رقم الشاخص</td><td>{signs[i]}</td></tr>"
+                "</table>]]></description>"
+            )
+        else:
+            meta = (
+                "<ExtendedData>"
+                f'<Data name="square_number"><value>{squares[i]}</value></Data>'
+                f'<Data name="sign_number"><value>{signs[i]}</value></Data>'
+                "</ExtendedData>"
+            )
+        out.write(
+            f"<Placemark><name>Zone {i + 1}</name>{meta}"
+            "<Polygon><outerBoundaryIs><LinearRing>"
+            f"<coordinates>{coords}</coordinates>"
+            "</LinearRing></outerBoundaryIs></Polygon></Placemark>\n"
+        )
+    out.write("</Document></kml>\n")
+    return out.getvalue().encode("utf-8")
+
+
+def make_zone_kmz(n_zones, vertices=8, metadata="extended", seed=0):
+    """نفس make_zone_kml لكن مضغوط كـ KMZ"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as kmz:
+        kmz.writestr("doc.kml", make_zone_kml(n_zones, vertices, metadata, seed))
+    return buf.getvalue()
+
+
+def make_points(n_zones, n_points, vertices=8, mix=(0.7, 0.1, 0.2), seed=1):
+    """نقاط اختبار: داخل الزونات، على حدودها، وخارجها بنسب mix
+
+    نصف النقاط تحمل رقم المربع والشاخص الصحيح لزونها والباقي أرقام خاطئة.
+    """
+    rng = np.random.default_rng(seed)
+    rings = zone_rings(n_zones, vertices, 0)
+    squares, signs = zone_labels(n_zones)
+    rows, cols = _grid_shape(n_zones)
+
+    n_inside = int(n_points * mix[0])
+    n_boundary = int(n_points * mix[1])
+    n_outside = n_points - n_inside - n_boundary
+
+    # داخل: قريبة من مركز الزون
+    zi = rng.integers(0, n_zones, n_inside)
+    # مركز كل زون مرة واحدة (n_zones × 2)، وليس رؤوس كل نقطة (n_points × vertices × 2)
+    centers = rings.mean(axis=1)[zi]
+    inside = centers + rng.uniform(-0.1, 0.1, size=(n_inside, 2)) * CELL_DEG
+
+    # على الحدود: رؤوس الزونات نفسها بنفس دقة الكتابة في KML
+    zb = rng.integers(0, n_zones, n_boundary)
+    boundary = np.char.mod("%.7f", rings[zb, rng.integers(0, vertices, n_boundary)]).astype(float)
+
+    # خارج: زوايا الخلايا (بين الزونات) أو خارج الشبكة
+    cell = rng.integers(0, n_zones, n_outside)
+    outside = np.column_stack([
+        ORIGIN[0] + (cell % cols) * CELL_DEG,
+        ORIGIN[1] + (cell // cols) * CELL_DEG
+    ]) + rng.uniform(0, 0.02, size=(n_outside, 2)) * CELL_DEG
+
+    xy = np.vstack([inside, boundary, outside])
+    zone_of = np.concatenate([zi, zb, cell])
+    kinds = ["inside"] * n_inside + ["boundary"] * n_boundary + ["outside"] * n_outside
+    # 50% صحيحة، 25% شاخص خاطئ فقط، 25% مربع وشاخص خاطئين
+    match = rng.random(n_points)
+
+    sq = np.array(squares, dtype=object)[zone_of]
+    sg = np.array(signs, dtype=object)[zone_of]
+    sg[match >= 0.5] = "0/0"
+    sq[match >= 0.75] = "0X"
+
+    return pd.DataFrame({
+        "location_type": kinds,
+        "id": np.arange(1, n_points + 1),
+        "lat": xy[:, 1],
+        "lon": xy[:, 0],
+        "square_number": sq,
+        "sign_number": sg
+    })
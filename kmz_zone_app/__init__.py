@@ -0,0 +1,104 @@
+# ======================================================
+# أداة استخراج وفحص الزونات (بدون واجهة Streamlit)
+# ======================================================
+from .geo import (
+    haversine_m,
+    polygons_area_sqm,
+    polygons_center,
+    simplify_polygons,
+    calculate_area_in_sqm,
+    calculate_distance_in_meters
+)
+from .index import (
+    DEFAULT_GRID_CELL_M,
+    DEFAULT_GRID_MAX_BYTES,
+    interior_rectangles,
+    ZoneGrid,
+    build_zone_grid,
+    ZoneIndex,
+    OverlayZoneIndex
+)
+from .zones import (
+    iter_placemarks,
+    parse_coordinates_text,
+    polygon_coordinates,
+    coordinates_polygon,
+    coordinates_json,
+    parse_kmz_or_kml,
+    load_polygons_from_excel,
+    compile_zones,
+    load_compiled_zones,
+    load_zone_layer,
+    zones_export_frame,
+    file_sha256,
+    zone_layer_nbytes,
+    ZoneLayerCache
+)
+from .points import (
+    NEAREST_MODES,
+    find_point,
+    find_points_bulk,
+    compare_zone_data,
+    compare_zone_data_bulk,
+    ZONE_POLICIES,
+    DEFAULT_PRIORITY_COLUMN,
+    order_zone_pairs,
+    zone_matches_json,
+    find_edge_zones,
+    run_points_test,
+    find_nearest_zones_bulk,
+    find_nearest_zone,
+    add_nearest_zone_columns
+)
+from .export import (
+    ZONE_STYLE_MODES,
+    DEFAULT_PALETTE_SIZE,
+    random_kml_color,
+    kml_palette,
+    greedy_coloring,
+    zone_style_indices,
+    iter_kml_z,
+    export_kml_z,
+    write_kml_chunks,
+    write_kml_z,
+    DEFAULT_LOD_LEVELS,
+    write_kml_z_lod,
+    iter_points_kml,
+    export_points_to_kml,
+    write_points_kml
+)
+from .pipeline import (
+    POINT_FILE_TYPES,
+    TABLE_MIME_TYPES,
+    XLSX_AUTO_MAX_ROWS,
+    auto_table_format,
+    read_points_table,
+    write_points_table,
+    write_zones_table,
+    iter_point_chunks,
+    run_points_pipeline
+)
+from .store import (
+    ZONE_CHANGE_ACTIONS,
+    ZONE_CHANGE_FILE_TYPES,
+    load_zone_changes,
+    ZoneStore
+)
+from .qa import (
+    DEFAULT_MIN_AREA_SQM,
+    find_overlaps,
+    find_invalid,
+    find_duplicates,
+    zones_union,
+    find_gaps,
+    zone_qa_report,
+    repair_invalid_zones,
+    write_qa_excel,
+    iter_qa_kml,
+    write_qa_kml
+)
+from .monitor import (
+    JobCancelled,
+    JobMonitor,
+    RssSampler
+)
@@ -0,0 +1,287 @@
+# ======================================================
+# واجهة سطر الأوامر (بدون Streamlit) للمهام الليلية والدفعات
+# ======================================================
+import os
+import sys
+import json
+import argparse
+
+import pyarrow as pa
+from shapely.geometry import Point
+
+from .zones import load_zone_layer
+from .monitor import JobCancelled, JobMonitor
+from .index import DEFAULT_GRID_MAX_BYTES
+from .store import load_zone_changes, ZoneStore
+from .qa import DEFAULT_MIN_AREA_SQM, zone_qa_report, write_qa_excel, write_qa_kml
+from .points import (
+    NEAREST_MODES,
+    ZONE_POLICIES,
+    DEFAULT_PRIORITY_COLUMN,
+    find_point,
+    run_points_test,
+    add_nearest_zone_columns
+)
+from .export import ZONE_STYLE_MODES, DEFAULT_PALETTE_SIZE, write_kml_z, write_kml_z_lod, write_points_kml
+from .pipeline import (
+    DEFAULT_CHUNK_SIZE,
+    read_points_table,
+    write_points_table,
+    write_zones_table,
+    run_points_pipeline
+)
+
+
+def _ext(path):
+    return os.path.splitext(str(path))[1].lower()
+
+
+def _print_progress(stage, done, total):
+    """سطر تقدم في stderr (مع --progress)"""
+    if total:
+        print(f"{stage}: {done}/{total} ({100 * done / total:.0f}%)", file=sys.stderr)
+    else:
+        print(f"{stage}: {done}", file=sys.stderr)
+
+
+def _load_layer(args):
+    """تحميل طبقة الزونات مع ملفات التعديلات وجدول البحث الشبكي إذا طُلبت"""
+    monitor = args.monitor
+    with monitor.stage("load_zones") as stage:
+        df, spatial_index = load_zone_layer(args.zones, args.accurate_area, monitor)
+        stage["items"] = len(df)
+    if args.grid_m:
+        with monitor.stage("grid", len(df)):
+            spatial_index.enable_grid(args.grid_m, args.grid_mb * 1024 * 1024)
+    if args.changes:
+        with monitor.stage("zone_changes", len(args.changes)):
+            store = ZoneStore(df, spatial_index, args.accurate_area)
+            for path in args.changes:
+                summary = store.apply(load_zone_changes(path))
+                print(f"{path}: {json.dumps(summary)}", file=sys.stderr)
+            df, spatial_index = store.layer()
+    return df, spatial_index
+
+
+def _write_results(df, path, monitor, folder_limit=None):
+    """كتابة نتائج النقاط (xlsx / csv / parquet / kml / kmz)"""
+    ext = _ext(path)
+    with monitor.stage("write_results", len(df)):
+        if ext in (".kml", ".kmz"):
+            write_points_kml(df, path, kmz=ext == ".kmz", folder_limit=folder_limit,
+                             monitor=monitor)
+        else:
+            write_points_table(df, path, monitor=monitor)
+
+
+def cmd_test_points(args):
+    monitor = args.monitor
+    df, spatial_index = _load_layer(args)
+
+    if args.workers > 1:
+        if _ext(args.output) not in (".csv", ".parquet"):
+            raise ValueError("المعالجة المتوازية تكتب csv أو parquet فقط")
+        with monitor.stage("pipeline") as stage:
+            summary = run_points_pipeline(
+                args.points, df, args.output,
+                chunk_size=args.chunk_size,
+                workers=args.workers,
+                nearest_mode=args.nearest,
+                grid_cell_m=args.grid_m,
+                grid_max_bytes=args.grid_mb * 1024 * 1024,
+                monitor=monitor,
+                policy=args.policy,
+                priority_column=args.priority_column,
+                explode=args.explode,
+                tolerance_m=args.tolerance_m
+            )
+            stage["items"] = summary["rows"]
+        print(json.dumps(summary, ensure_ascii=False))
+        return 0
+
+    with monitor.stage("read_points") as stage:
+        points_df = read_points_table(args.points)
+        stage["items"] = len(points_df)
+    with monitor.stage("point_test", len(points_df)):
+        out_df = run_points_test(
+            points_df, df, spatial_index, monitor,
+            policy=args.policy, priority_column=args.priority_column, explode=args.explode,
+            tolerance_m=args.tolerance_m
+        )
+    if args.nearest:
+        with monitor.stage("nearest", len(out_df)):
+            out_df = add_nearest_zone_columns(out_df, df, spatial_index, args.nearest, monitor)
+    _write_results(out_df, args.output, monitor, args.folder_limit)
+
+    print(json.dumps({
+        "rows": len(out_df),
+        "seconds": monitor.report()["total_seconds"],
+        "output": args.output
+    }, ensure_ascii=False))
+    return 0
+
+
+def cmd_nearest(args):
+    monitor = args.monitor
+    df, spatial_index = _load_layer(args)
+    with monitor.stage("read_points") as stage:
+        results_df = read_points_table(args.results)
+        stage["items"] = len(results_df)
+    if "CMP_Result" not in results_df.columns:
+        raise ValueError("ملف النتائج لا يحتوي على عامود CMP_Result")
+
+    with monitor.stage("nearest", len(results_df)):
+        final_df = add_nearest_zone_columns(results_df, df, spatial_index, args.mode, monitor)
+    _write_results(final_df, args.output, monitor)
+    print(f"تم معالجة {len(final_df)} نقطة ← {args.output}")
+    return 0
+
+
+def cmd_find_point(args):
+    df, spatial_index = _load_layer(args)
+    matches = find_point(Point(args.lon, args.lat), df, spatial_index)
+    print(json.dumps(matches, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_export_zones(args):
+    monitor = args.monitor
+    df, spatial_index = _load_layer(args)
+    ext = _ext(args.output)
+
+    if args.lod and ext != ".kmz":
+        raise ValueError("التصدير بمستويات التفاصيل (--lod) يتطلب ملف .kmz")
+    with monitor.stage("export_zones", len(df)):
+        if args.lod:
+            write_kml_z_lod(
+                df, f"{args.alpha:02x}", args.output, tiles=args.tiles,
+                style_mode=args.style, palette_size=args.palette,
+                spatial_index=spatial_index
+            )
+        elif ext in (".kml", ".kmz"):
+            write_kml_z(
+                df, f"{args.alpha:02x}", args.output, kmz=ext == ".kmz",
+                style_mode=args.style, palette_size=args.palette,
+                spatial_index=spatial_index, simplify_m=args.simplify_m,
+                monitor=monitor
+            )
+        else:
+            write_zones_table(df, args.output, source_name=os.path.basename(args.zones))
+
+    print(f"تم تصدير {len(df)} زون ← {args.output}")
+    return 0
+
+
+def cmd_qa(args):
+    monitor = args.monitor
+    df, spatial_index = _load_layer(args)
+    with monitor.stage("qa", len(df)):
+        report = zone_qa_report(df, spatial_index, extent=args.extent, min_area_sqm=args.min_area)
+
+    ext = _ext(args.output)
+    with monitor.stage("write_report"):
+        if ext in (".kml", ".kmz"):
+            write_qa_kml(report, args.output, kmz=ext == ".kmz")
+        else:
+            write_qa_excel(report, args.output)
+
+    for check, value in report["summary"].itertuples(index=False):
+        print(f"{check}: {value}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m kmz_zone_app",
+        description="استخراج وفحص الزونات من سطر الأوامر (KMZ / KML / Excel / Parquet)"
+    )
+    parser.add_argument("--accurate-area", action="store_true",
+                        help="حساب دقيق للمساحة (إسقاط متساوي المساحة)")
+    parser.add_argument("--grid-m", type=float, default=0.0,
+                        help="جدول بحث شبكي بهذا الحجم للخلية (متر) لتسريع فحص النقاط (0 = بدون)")
+    parser.add_argument("--grid-mb", type=int, default=DEFAULT_GRID_MAX_BYTES // (1024 * 1024),
+                        help="الحد الأقصى لذاكرة الجدول الشبكي (ميجابايت)")
+    parser.add_argument("--changes", action="append", default=[],
+                        help="ملف تعديلات زونات يُطبّق على الطبقة (يمكن تكراره بالترتيب)")
+    parser.add_argument("--progress", action="store_true",
+                        help="طباعة تقدم كل مرحلة في stderr")
+    parser.add_argument("--perf-json",
+                        help="حفظ زمن كل مرحلة (ثوانٍ، عناصر/ثانية، أعلى ذاكرة) في ملف JSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("test-points", help="فحص ملف نقاط ضد الزونات")
+    p.add_argument("zones", help="ملف الزونات (kmz / kml / xlsx / parquet مجمّع)")
+    p.add_argument("points", help="ملف النقاط (xlsx / csv / parquet)")
+    p.add_argument("-o", "--output", required=True, help="ملف النتائج (xlsx / csv / parquet / kml / kmz)")
+    p.add_argument("--nearest", choices=NEAREST_MODES, help="إضافة أقرب زون للنقاط 3 و 4")
+    p.add_argument("--policy", choices=ZONE_POLICIES, default="first",
+                   help="اختيار الزون عند وقوع النقطة في أكثر من زون")
+    p.add_argument("--priority-column", default=DEFAULT_PRIORITY_COLUMN,
+                   help="عامود الأولوية في طبقة الزونات مع --policy priority (الأصغر أولاً)")
+    p.add_argument("--explode", action="store_true",
+                   help="صف لكل (نقطة، زون) بدل صف واحد لكل نقطة")
+    p.add_argument("--tolerance-m", type=float, default=0.0,
+                   help="النقاط خارج الزونات على بعد هذه المسافة (متر) من حدود زون تأخذ CMP_Result = 5")
+    p.add_argument("--workers", type=int, default=1, help="عدد العمليات المتوازية (1 = بدون توازي)")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="عدد النقاط في كل دفعة")
+    p.add_argument("--folder-limit", type=int,
+                   help="مع kmz: تقسيم المجلدات الأكبر من هذا العدد إلى ملفات NetworkLink")
+    p.set_defaults(func=cmd_test_points)
+
+    p = sub.add_parser("nearest", help="إيجاد أقرب زون لنقاط ملف نتائج (CMP_Result = 3 أو 4)")
+    p.add_argument("zones")
+    p.add_argument("results", help="ملف نتائج النقاط (xlsx / csv / parquet)")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--mode", choices=NEAREST_MODES, default="center")
+    p.set_defaults(func=cmd_nearest)
+
+    p = sub.add_parser("find-point", help="إيجاد الزونات التي تحتوي نقطة واحدة")
+    p.add_argument("zones")
+    p.add_argument("lat", type=float)
+    p.add_argument("lon", type=float)
+    p.set_defaults(func=cmd_find_point)
+
+    p = sub.add_parser("export-zones", help="تصدير الزونات (kml / kmz / xlsx / csv / parquet مجمّع)")
+    p.add_argument("zones")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--alpha", type=int, default=85, help="شفافية داخل الزون في KML (0-255)")
+    p.add_argument("--style", choices=ZONE_STYLE_MODES, default="inline",
+                   help="تلوين الزونات: inline لون عشوائي لكل زون، أو لوحة ألوان مشتركة")
+    p.add_argument("--palette", type=int, default=DEFAULT_PALETTE_SIZE, help="عدد الألوان في اللوحة")
+    p.add_argument("--simplify-m", type=float, default=0.0,
+                   help="تبسيط إحداثيات KML بالمتر (0 = بدون تبسيط)")
+    p.add_argument("--lod", action="store_true",
+                   help="KMZ بمستويات تفاصيل (Region / NetworkLink) بدل ملف واحد")
+    p.add_argument("--tiles", type=int, default=4, help="عدد المربعات في كل اتجاه مع --lod")
+    p.set_defaults(func=cmd_export_zones)
+
+    p = sub.add_parser("qa", help="فحص جودة طبقة الزونات (تداخل / فجوات / غير صالح / تكرار)")
+    p.add_argument("zones")
+    p.add_argument("-o", "--output", required=True, help="ملف التقرير (xlsx / kml / kmz)")
+    p.add_argument("--extent", type=float, nargs=4, metavar=("MINX", "MINY", "MAXX", "MAXY"),
+                   help="منطقة يجب أن تغطيها الزونات بالكامل (بدونها: الفراغات المحاطة بالزونات فقط)")
+    p.add_argument("--min-area", type=float, default=DEFAULT_MIN_AREA_SQM,
+                   help="أقل مساحة (متر مربع) للتداخل أو الفجوة")
+    p.set_defaults(func=cmd_qa)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.monitor = JobMonitor(
+        args.command, progress=_print_progress if args.progress else None, min_interval=1.0
+    )
+    try:
+        return args.func(args)
+    except (ValueError, OSError, pa.ArrowException) as e:
+        print(f"خطأ: {e}", file=sys.stderr)
+        return 1
+    except (KeyboardInterrupt, JobCancelled):
+        print("تم الإلغاء", file=sys.stderr)
+        return 130
+    finally:
+        # التقرير يُحفظ حتى عند الخطأ أو الإلغاء (المراحل المكتملة وحالة الأخيرة)
+        if args.perf_json:
+            with open(args.perf_json, "w", encoding="utf-8") as f:
+                f.write(args.monitor.to_json(indent=2))
@@ -0,0 +1,552 @@
+# ======================================================
+# تصدير KML
+# ======================================================
+import os
+import random
+import zipfile
+import colorsys
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from shapely.strtree import STRtree
+
+from .geo import simplify_polygons
+
+
+def random_kml_color(fill_alpha="55", line_alpha="FF"):
+    """توليد لون عشوائي لـ KML"""
+    r, g, b = [random.randint(0, 255) for _ in range(3)]
+    return (
+        f"{fill_alpha}{b:02x}{g:02x}{r:02x}",
+        f"{line_alpha}{b:02x}{g:02x}{r:02x}"
+    )
+
+
+# طرق تلوين الزونات في KML:
+# inline: لون عشوائي و <Style> داخل كل Placemark
+# square: لوحة ألوان ثابتة، لون لكل رقم مربع
+# neighbors: لوحة ألوان ثابتة مع اختلاف لون الزونات المتجاورة
+ZONE_STYLE_MODES = ("inline", "square", "neighbors")
+DEFAULT_PALETTE_SIZE = 12
+
+
+def kml_palette(n, fill_alpha="55", line_alpha="FF"):
+    """لوحة من n لون (fill, line) موزعة بالتساوي على دائرة الألوان"""
+    palette = []
+    for i in range(n):
+        r, g, b = (int(v * 255) for v in colorsys.hsv_to_rgb(i / n, 0.85, 0.95))
+        palette.append((
+            f"{fill_alpha}{b:02x}{g:02x}{r:02x}",
+            f"{line_alpha}{b:02x}{g:02x}{r:02x}"
+        ))
+    return palette
+
+
+def greedy_coloring(pairs, n, n_colors):
+    """تلوين الزونات بحيث يختلف لون المتجاورة قدر الإمكان (Welsh-Powell)
+
+    pairs: مصفوفة (2, m) لأزواج الزونات المتجاورة. إذا لم تكفِ الألوان يُختار
+    اللون الأقل تكراراً بين الجيران.
+    """
+    a, b = pairs
+    keep = a != b
+    a, b = np.concatenate([a[keep], b[keep]]), np.concatenate([b[keep], a[keep]])
+    order = np.argsort(a, kind="stable")
+    neighbors = b[order]
+    offsets = np.searchsorted(a[order], np.arange(n + 1))
+    degree = np.diff(offsets)
+
+    colors = np.full(n, -1, dtype=np.int64)
+    for zone in np.argsort(-degree, kind="stable").tolist():
+        used = colors[neighbors[offsets[zone]:offsets[zone + 1]]]
+        counts = np.bincount(used[used >= 0], minlength=n_colors)
+        colors[zone] = int(np.argmin(counts))
+    return colors
+
+
+def zone_style_indices(df, mode, palette_size=DEFAULT_PALETTE_SIZE, spatial_index=None):
+    """رقم اللون في اللوحة لكل زون حسب طريقة التلوين"""
+    if mode == "square":
+        codes, _ = pd.factorize(df["square_number"].astype(object).map(str))
+        return codes % palette_size
+    if mode == "neighbors":
+        polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+        if spatial_index is None:
+            spatial_index = STRtree(polygons)
+        pairs = spatial_index.query(polygons, predicate="intersects")
+        return greedy_coloring(pairs, len(df), palette_size)
+    raise ValueError(f"طريقة تلوين غير معروفة: {mode}")
+
+
+# عدد الزونات التي تُجهّز إحداثياتها معاً أثناء الكتابة
+KML_WRITE_BATCH = 5000
+
+
+def _xml_text(value):
+    """تهريب النص داخل عنصر XML (نفس minidom)"""
+    return escape(str(value), {'"': "&quot;"})
+
+
+def _ring_texts(rings):
+    """نص <coordinates> (lon,lat,0) لكل حلقة"""
+    flat, ring_idx = shapely.get_coordinates(rings, return_index=True)
+    bounds = np.searchsorted(ring_idx, np.arange(len(rings) + 1))
+    vertices = [f"{lon},{lat},0" for lon, lat in flat.tolist()]
+    return [" ".join(vertices[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _boundary_xml(tag, coord_text, indent):
+    return (
+        f'{indent}<{tag}>\n'
+        f'{indent}  <LinearRing>\n'
+        f'{indent}    <coordinates>{coord_text}</coordinates>\n'
+        f'{indent}  </LinearRing>\n'
+        f'{indent}</{tag}>\n'
+    )
+
+
+def _polygons_kml(polygons, indent):
+    """عنصر <Polygon> (مع الثقوب innerBoundaryIs) أو <MultiGeometry> لكل بوليقون"""
+    polygons = np.asarray(polygons, dtype=object)
+    parts, part_owner = shapely.get_parts(polygons, return_index=True)
+    rings, ring_owner = shapely.get_rings(parts, return_index=True)
+    texts = _ring_texts(rings)
+    ring_bounds = np.searchsorted(ring_owner, np.arange(len(parts) + 1)).tolist()
+    part_bounds = np.searchsorted(part_owner, np.arange(len(polygons) + 1)).tolist()
+
+    def polygon_xml(part, ind):
+        a, b = ring_bounds[part], ring_bounds[part + 1]
+        return (
+            f'{ind}<Polygon>\n'
+            + _boundary_xml("outerBoundaryIs", texts[a] if b > a else "", ind + "  ")
+            + "".join(_boundary_xml("innerBoundaryIs", t, ind + "  ") for t in texts[a + 1:b])
+            + f'{ind}</Polygon>\n'
+        )
+
+    out = []
+    for a, b in zip(part_bounds[:-1], part_bounds[1:]):
+        if b - a == 1:
+            out.append(polygon_xml(a, indent))
+        else:
+            out.append(
+                f'{indent}<MultiGeometry>\n'
+                + "".join(polygon_xml(p, indent + "  ") for p in range(a, b))
+                + f'{indent}</MultiGeometry>\n'
+            )
+    return out
+
+
+def _kml_style_xml(fill, line, indent, style_id=None):
+    """عنصر <Style> بـ LineStyle و PolyStyle"""
+    attr = f' id="{style_id}"' if style_id else ""
+    return (
+        f'{indent}<Style{attr}>\n'
+        f'{indent}  <LineStyle>\n'
+        f'{indent}    <color>{line}</color>\n'
+        f'{indent}    <width>2</width>\n'
+        f'{indent}  </LineStyle>\n'
+        f'{indent}  <PolyStyle>\n'
+        f'{indent}    <color>{fill}</color>\n'
+        f'{indent}  </PolyStyle>\n'
+        f'{indent}</Style>\n'
+    )
+
+
+def _zone_styles(df, fill_alpha, style_mode, palette_size, spatial_index):
+    """(رقم اللون في اللوحة لكل زون، ألوان عشوائية لكل زون) حسب طريقة التلوين"""
+    if style_mode == "inline":
+        return None, [random_kml_color(fill_alpha, "FF") for _ in range(len(df))]
+    return zone_style_indices(df, style_mode, palette_size, spatial_index), None
+
+
+def _kml_z_header(style_idx, fill_alpha, palette_size):
+    header = (
+        '<?xml version="1.0" ?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+        '  <Document>\n'
+    )
+    if style_idx is not None:
+        header += "".join(
+            _kml_style_xml(fill, line, "    ", f"zone-style-{i}")
+            for i, (fill, line) in enumerate(kml_palette(palette_size, fill_alpha))
+        )
+    return header
+
+
+_KML_Z_FOOTER = '  </Document>\n</kml>\n'
+
+
+def _iter_zone_placemarks(df, polygons, style_idx, colors, monitor=None):
+    """نصوص Placemarks للزونات على دفعات (polygons قد تكون نسخة مبسطة)"""
+    for start in range(0, len(df), KML_WRITE_BATCH):
+        if monitor is not None:
+            monitor.update(start, len(df))
+        end = start + KML_WRITE_BATCH
+        batch = df.iloc[start:end]
+        geometries = _polygons_kml(polygons[start:end], "      ")
+        if style_idx is not None:
+            styles = [
+                f"      <styleUrl>#zone-style-{i}</styleUrl>\n"
+                for i in style_idx[start:end].tolist()
+            ]
+        else:
+            styles = [_kml_style_xml(fill, line, "      ") for fill, line in colors[start:end]]
+
+        for polygon_id, square, sign, area, geometry, style in zip(
+            batch["polygon_id"].tolist(),
+            batch["square_number"].tolist(),
+            batch["sign_number"].tolist(),
+            batch["Area"].tolist(),
+            geometries,
+            styles
+        ):
+            yield (
+                '    <Placemark>\n'
+                f'      <name>Polygon {_xml_text(polygon_id)}</name>\n'
+                '      <ExtendedData>\n'
+                '        <Data name="square_number">\n'
+                f'          <value>{_xml_text(square)}</value>\n'
+                '        </Data>\n'
+                '        <Data name="sign_number">\n'
+                f'          <value>{_xml_text(sign)}</value>\n'
+                '        </Data>\n'
+                '        <Data name="Area_sqm">\n'
+                f'          <value>{area:.2f}</value>\n'
+                '        </Data>\n'
+                '      </ExtendedData>\n'
+                f'{style}'
+                f'{geometry}'
+                '    </Placemark>\n'
+            )
+    if monitor is not None:
+        monitor.update(len(df), len(df))
+
+
+def iter_kml_z(df, fill_alpha, style_mode="inline", palette_size=DEFAULT_PALETTE_SIZE,
+               spatial_index=None, simplify_m=None, monitor=None):
+    """توليد KML الزونات كأجزاء نصية متتالية بدون بناء شجرة XML في الذاكرة
+
+    style_mode غير "inline" يكتب لوحة ألوان مرة واحدة في Document وكل زون
+    يشير لها بـ <styleUrl> (انظر ZONE_STYLE_MODES).
+    simplify_m: تبسيط الإحداثيات المكتوبة فقط (بالمتر)، الطبقة نفسها لا تتغير.
+    monitor (JobMonitor اختياري): التقدم بعدد الزونات المكتوبة وإمكانية الإلغاء.
+    """
+    style_idx, colors = _zone_styles(df, fill_alpha, style_mode, palette_size, spatial_index)
+    polygons = simplify_polygons(df["polygon"].tolist(), simplify_m)
+
+    yield _kml_z_header(style_idx, fill_alpha, palette_size)
+    yield from _iter_zone_placemarks(df, polygons, style_idx, colors, monitor)
+    yield _KML_Z_FOOTER
+
+
+def export_kml_z(df, fill_alpha, style_mode="inline", palette_size=DEFAULT_PALETTE_SIZE,
+                 spatial_index=None, simplify_m=None):
+    """KML الزونات كنص واحد"""
+    return "".join(iter_kml_z(df, fill_alpha, style_mode, palette_size, spatial_index, simplify_m))
+
+
+def write_kml_chunks(chunks, target, kmz=False, kml_name="doc.kml"):
+    """كتابة أجزاء KML مباشرة إلى ملف أو file-like، أو داخل KMZ مضغوط"""
+    if kmz:
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(kml_name, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk.encode("utf-8"))
+        return
+
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk.encode("utf-8"))
+    else:
+        for chunk in chunks:
+            target.write(chunk.encode("utf-8"))
+
+
+def write_kml_z(df, fill_alpha, target, kmz=False, style_mode="inline",
+                palette_size=DEFAULT_PALETTE_SIZE, spatial_index=None, simplify_m=None,
+                monitor=None):
+    """كتابة KML الزونات تدريجياً إلى target (kml أو kmz)"""
+    write_kml_chunks(
+        iter_kml_z(df, fill_alpha, style_mode, palette_size, spatial_index, simplify_m, monitor),
+        target,
+        kmz
+    )
+
+
+# مستويات التفاصيل: (تبسيط بالمتر، minLodPixels، maxLodPixels)
+# كل مستوى يظهر فقط عندما يكون حجم المربع على الشاشة داخل مداه
+DEFAULT_LOD_LEVELS = (
+    (20.0, 64, 512),
+    (2.0, 512, 2048),
+    (0.0, 2048, -1)
+)
+
+
+def _zone_tiles(polygons, tiles):
+    """رقم المربع (tile) لكل زون حسب نقطة منتصفه في شبكة tiles × tiles"""
+    minx, miny, maxx, maxy = shapely.total_bounds(polygons)
+    xy = shapely.get_coordinates(shapely.centroid(polygons))
+    width = max(maxx - minx, 1e-12)
+    height = max(maxy - miny, 1e-12)
+    tx = np.clip(((xy[:, 0] - minx) / width * tiles).astype(int), 0, tiles - 1)
+    ty = np.clip(((xy[:, 1] - miny) / height * tiles).astype(int), 0, tiles - 1)
+    return ty * tiles + tx
+
+
+def write_kml_z_lod(df, fill_alpha, target, levels=DEFAULT_LOD_LEVELS, tiles=4,
+                    style_mode="inline", palette_size=DEFAULT_PALETTE_SIZE, spatial_index=None):
+    """KMZ للزونات بمستويات تفاصيل (Region / Lod)
+
+    الطبقة تُقسّم إلى tiles × tiles مربع، ولكل مربع ومستوى ملف KML منفصل داخل
+    الـ KMZ يُحمَّل عبر <NetworkLink> فقط عندما تصبح منطقته ظاهرة بالحجم المناسب،
+    فيحمّل Google Earth الإحداثيات المبسطة أولاً ثم التفاصيل عند التقريب.
+    """
+    polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+    style_idx, colors = _zone_styles(df, fill_alpha, style_mode, palette_size, spatial_index)
+    header = _kml_z_header(style_idx, fill_alpha, palette_size)
+
+    tile_of = _zone_tiles(polygons, tiles) if len(df) else np.empty(0, dtype=int)
+    bounds = shapely.bounds(polygons)
+    tile_rows = [(t, np.flatnonzero(tile_of == t)) for t in np.unique(tile_of).tolist()]
+
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+        # الملف الرئيسي (أول KML في الـ KMZ) يحتوي الروابط فقط
+        with archive.open("doc.kml", "w") as f:
+            f.write(header.encode("utf-8"))
+            for t, rows in tile_rows:
+                west, south = bounds[rows, 0].min(), bounds[rows, 1].min()
+                east, north = bounds[rows, 2].max(), bounds[rows, 3].max()
+                for level, (_, min_px, max_px) in enumerate(levels):
+                    f.write((
+                        '    <NetworkLink>\n'
+                        f'      <name>Tile {t} - Level {level}</name>\n'
+                        '      <Region>\n'
+                        '        <LatLonAltBox>\n'
+                        f'          <north>{north}</north>\n'
+                        f'          <south>{south}</south>\n'
+                        f'          <east>{east}</east>\n'
+                        f'          <west>{west}</west>\n'
+                        '        </LatLonAltBox>\n'
+                        f'        <Lod><minLodPixels>{min_px}</minLodPixels>'
+                        f'<maxLodPixels>{max_px}</maxLodPixels></Lod>\n'
+                        '      </Region>\n'
+                        '      <Link>\n'
+                        f'        <href>tiles/L{level}_T{t}.kml</href>\n'
+                        '        <viewRefreshMode>onRegion</viewRefreshMode>\n'
+                        '      </Link>\n'
+                        '    </NetworkLink>\n'
+                    ).encode("utf-8"))
+            f.write(_KML_Z_FOOTER.encode("utf-8"))
+
+        for level, (tolerance_m, _, _) in enumerate(levels):
+            simplified = simplify_polygons(polygons, tolerance_m)
+            for t, rows in tile_rows:
+                with archive.open(f"tiles/L{level}_T{t}.kml", "w") as f:
+                    f.write(header.encode("utf-8"))
+                    for chunk in _iter_zone_placemarks(
+                        df.iloc[rows],
+                        simplified[rows],
+                        style_idx[rows] if style_idx is not None else None,
+                        [colors[i] for i in rows.tolist()] if colors is not None else None
+                    ):
+                        f.write(chunk.encode("utf-8"))
+                    f.write(_KML_Z_FOOTER.encode("utf-8"))
+
+
+# مجموعات النقاط حسب CMP_Result ولون كل مجموعة
+POINT_RESULT_GROUPS = {
+    1: ("Correct Match (Sign)", "greenPin"),
+    2: ("Partial Match (Square Only)", "yellowPin"),
+    3: ("No Match", "orangePin"),
+    4: ("Outside All Zones", "redPin"),
+    5: ("Near Zone Edge (Within Tolerance)", "purplePin")
+}
+
+# عدد النقاط التي تُنسّق معاً في كل دفعة أثناء الكتابة
+POINT_KML_BATCH = 50000
+
+
+def _point_styles_kml():
+    """Styles النقاط حسب CMP_Result (أخضر، أصفر، برتقالي، أحمر، بنفسجي)"""
+    lines = []
+    for style_id, color, icon in [
+        ("greenPin", "ff00ff00", "grn-circle"),
+        ("yellowPin", "ff00ffff", "ylw-circle"),
+        ("orangePin", "ff0080ff", "orange-circle"),
+        ("redPin", "ff0000ff", "red-circle"),
+        ("purplePin", "ffff0080", "purple-circle")
+    ]:
+        lines += [
+            f'  <Style id="{style_id}">',
+            '    <IconStyle>',
+            f'      <color>{color}</color>',
+            '      <scale>1.2</scale>',
+            '      <Icon>',
+            f'        <href>http://maps.google.com/mapfiles/kml/paddle/{icon}.png</href>',
+            '      </Icon>',
+            '    </IconStyle>',
+            '  </Style>'
+        ]
+    return lines
+
+
+def _points_kml_header():
+    return "\n".join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<kml xmlns="http://www.opengis.net/kml/2.2">',
+        '<Document>',
+        '  <name>Test Points Results</name>',
+        '  <description>Points tested against zones</description>',
+        *_point_styles_kml()
+    ]) + "\n"
+
+
+_POINTS_KML_FOOTER = "</Document>\n</kml>"
+
+
+def _str_column(df, name, default):
+    """عامود كنصوص (نفس str() لكل قيمة) أو القيمة الافتراضية إذا لم يوجد"""
+    if name not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return pd.Series(np.asarray(df[name], dtype=object).astype(str), index=df.index, dtype=object)
+
+
+def _point_placemarks(df, result_num=None):
+    """نص Placemark لكل نقطة في df دفعة واحدة (عمليات نصية على العواميد)"""
+    point_id = _str_column(df, "id", "Unknown")
+    coords = (
+        "          <coordinates>" + _str_column(df, "lon", "") + ","
+        + _str_column(df, "lat", "") + ",0</coordinates>\n"
+    )
+
+    if result_num is None:
+        return (
+            "      <Placemark>\n        <name>Point " + point_id + "</name>\n"
+            "        <Point>\n" + coords + "        </Point>\n      </Placemark>\n"
+        )
+
+    desc = (
+        "ID: " + point_id
+        + "<br>Location Type: " + _str_column(df, "location_type", "")
+        + "<br>Square: " + _str_column(df, "square_number", "")
+        + "<br>Sign: " + _str_column(df, "sign_number", "")
+        + "<br>Zones Count: " + _str_column(df, "polygons_count", "0")
+        + f"<br>CMP Result: {result_num}"
+    )
+    for col, label in [("CMP_square", "CMP Square"), ("CMP_sign", "CMP Sign")]:
+        if col in df.columns:
+            # نفس شرط "if row[col]" (القيم الفارغة لا تُكتب)
+            truthy = np.asarray(df[col], dtype=object).astype(bool)
+            desc = desc.where(~truthy, desc + f"<br>{label}: " + _str_column(df, col, ""))
+    if "edge_distance_m" in df.columns:
+        near = df["edge_distance_m"].notna()
+        desc = desc.where(
+            ~near, desc + "<br>Edge Distance (m): " + _str_column(df, "edge_distance_m", "")
+        )
+
+    style = POINT_RESULT_GROUPS[result_num][1]
+    return (
+        "      <Placemark>\n        <name>Point " + point_id + "</name>\n"
+        "        <description><![CDATA[" + desc + "]]></description>\n"
+        f"        <styleUrl>#{style}</styleUrl>\n"
+        "        <Point>\n" + coords + "        </Point>\n      </Placemark>\n"
+    )
+
+
+def _iter_folder_placemarks(df, result_num=None, batch_size=POINT_KML_BATCH, monitor=None):
+    """نصوص Placemarks لمجموعة نقاط على دفعات (monitor.advance بعد كل دفعة)"""
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        yield "".join(_point_placemarks(batch, result_num))
+        if monitor is not None:
+            monitor.advance(len(batch))
+
+
+def _point_groups(df_points):
+    """(رقم النتيجة، اسم المجلد، النقاط) لكل مجموعة غير فارغة"""
+    if "CMP_Result" not in df_points.columns:
+        return [(None, "All Points", df_points)]
+
+    groups = []
+    result = df_points["CMP_Result"].to_numpy()
+    for result_num, (result_name, _) in POINT_RESULT_GROUPS.items():
+        df_group = df_points[result == result_num]
+        if len(df_group) > 0:
+            groups.append((result_num, f"{result_name} ({len(df_group)} points)", df_group))
+    return groups
+
+
+def iter_points_kml(df_points, monitor=None):
+    """توليد KML النقاط كأجزاء نصية متتالية (مجلد لكل CMP_Result)
+
+    monitor (JobMonitor اختياري): التقدم بعدد النقاط المكتوبة (items المرحلة = عدد النقاط).
+    """
+    yield _points_kml_header()
+    for result_num, folder_name, df_group in _point_groups(df_points):
+        yield f"  <Folder><name>{folder_name}</name>\n"
+        yield from _iter_folder_placemarks(df_group, result_num, monitor=monitor)
+        yield "  </Folder>\n"
+    yield _POINTS_KML_FOOTER
+
+
+def export_points_to_kml(df_points):
+    """تصدير النقاط إلى ملف KML"""
+    return "".join(iter_points_kml(df_points))
+
+
+def write_points_kml(df_points, target, kmz=False, folder_limit=None, monitor=None):
+    """كتابة KML النقاط تدريجياً إلى target (kml أو kmz)
+
+    folder_limit (مع kmz فقط): المجلدات الأكبر من هذا العدد تُقسّم إلى ملفات
+    منفصلة داخل الـ KMZ يُشار لها بـ <NetworkLink> حتى يستطيع Google Earth فتحها.
+    """
+    if not folder_limit:
+        write_kml_chunks(iter_points_kml(df_points, monitor), target, kmz)
+        return
+    if not kmz:
+        raise ValueError("تقسيم المجلدات إلى ملفات يحتاج تصدير KMZ")
+
+    groups = _point_groups(df_points)
+
+    def part_name(result_num, k):
+        return f"parts/points_{result_num or 0}_{k:04d}.kml"
+
+    def root_chunks():
+        yield _points_kml_header()
+        for result_num, folder_name, df_group in groups:
+            yield f"  <Folder><name>{folder_name}</name>\n"
+            if len(df_group) <= folder_limit:
+                yield from _iter_folder_placemarks(df_group, result_num, monitor=monitor)
+            else:
+                for k, start in enumerate(range(0, len(df_group), folder_limit)):
+                    end = min(start + folder_limit, len(df_group))
+                    yield (
+                        "      <NetworkLink>\n"
+                        f"        <name>Points {start + 1}-{end}</name>\n"
+                        f"        <Link><href>{part_name(result_num, k)}</href></Link>\n"
+                        "      </NetworkLink>\n"
+                    )
+            yield "  </Folder>\n"
+        yield _POINTS_KML_FOOTER
+
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+        # الملف الرئيسي يجب أن يكون أول KML داخل الـ KMZ
+        with archive.open("doc.kml", "w") as f:
+            for chunk in root_chunks():
+                f.write(chunk.encode("utf-8"))
+
+        for result_num, folder_name, df_group in groups:
+            if len(df_group) <= folder_limit:
+                continue
+            for k, start in enumerate(range(0, len(df_group), folder_limit)):
+                part = df_group.iloc[start:start + folder_limit]
+                with archive.open(part_name(result_num, k), "w") as f:
+                    f.write(_points_kml_header().encode("utf-8"))
+                    f.write(f"  <Folder><name>{folder_name}</name>\n".encode("utf-8"))
+                    for chunk in _iter_folder_placemarks(part, result_num, monitor=monitor):
+                        f.write(chunk.encode("utf-8"))
+                    f.write(f"  </Folder>\n{_POINTS_KML_FOOTER}".encode("utf-8"))
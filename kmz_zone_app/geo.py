@@ -0,0 +1,85 @@
+# ======================================================
+# حسابات المسافة والمساحة
+# ======================================================
+import numpy as np
+import shapely
+
+from shapely.geometry import Point
+
+
+# 1 درجة عرض ≈ 111320 متر، و 1 درجة طول = 111320 * cos(lat) متر
+METERS_PER_DEGREE = 111320
+EARTH_RADIUS_M = 6371000  # نصف قطر الأرض بالمتر (Haversine)
+AUTHALIC_RADIUS_M = 6371007.2  # نصف قطر الكرة ذات المساحة المكافئة
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """حساب المسافة بالمتر بين مصفوفات نقاط باستخدام صيغة Haversine"""
+    lon1, lat1, lon2, lat2 = (
+        np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _equal_area_xy(coords):
+    """إسقاط Lambert الأسطواني متساوي المساحة (درجات ← متر)"""
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(coords[:, 1])
+    return np.column_stack([
+        AUTHALIC_RADIUS_M * lon,
+        AUTHALIC_RADIUS_M * np.sin(lat)
+    ])
+
+
+def polygons_area_sqm(polygons, accurate=False):
+    """حساب مساحة مجموعة بوليقونات بالمتر المربع دفعة واحدة
+
+    accurate=False: تقريب سريع بعامل cos(خط عرض نقطة المنتصف) لكل بوليقون
+    accurate=True: إسقاط متساوي المساحة، أدق للزونات الكبيرة
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    if accurate:
+        return shapely.area(shapely.transform(polygons, _equal_area_xy))
+
+    lat = shapely.get_y(shapely.centroid(polygons))
+    lon_factor = METERS_PER_DEGREE * np.cos(np.radians(lat))
+    return shapely.area(polygons) * lon_factor * METERS_PER_DEGREE
+
+
+def polygons_center(polygons):
+    """نقاط المنتصف (lon, lat) لمجموعة بوليقونات كقائمة tuples"""
+    xy = shapely.get_coordinates(shapely.centroid(np.asarray(polygons, dtype=object)))
+    return list(zip(xy[:, 0].tolist(), xy[:, 1].tolist()))
+
+
+def simplify_polygons(polygons, tolerance_m):
+    """تبسيط مجموعة بوليقونات مع الحفاظ على صحتها (tolerance بالمتر، 0 = بدون تبسيط)"""
+    polygons = np.asarray(polygons, dtype=object)
+    if not tolerance_m:
+        return polygons
+    return shapely.simplify(polygons, tolerance_m / METERS_PER_DEGREE, preserve_topology=True)
+
+
+def calculate_area_in_sqm(polygon, accurate=False):
+    """حساب مساحة البوليقون بالمتر المربع باستخدام تقريب"""
+    return float(polygons_area_sqm([polygon], accurate)[0])
+
+
+def calculate_distance_in_meters(point1, point2):
+    """حساب المسافة بين نقطتين بالمتر"""
+    # استخراج الإحداثيات
+    if isinstance(point1, Point):
+        lon1, lat1 = point1.x, point1.y
+    else:
+        lon1, lat1 = point1
+        
+    if isinstance(point2, Point):
+        lon2, lat2 = point2.x, point2.y
+    else:
+        lon2, lat2 = point2
+    
+    return float(haversine_m(lon1, lat1, lon2, lat2))
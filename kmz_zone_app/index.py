@@ -0,0 +1,470 @@
+# ======================================================
+# الفهرس المكاني لطبقة الزونات
+# ======================================================
+import math
+import threading
+
+import numpy as np
+import shapely
+
+from shapely.strtree import STRtree
+
+from .geo import METERS_PER_DEGREE
+
+
+# جدول البحث الشبكي: حجم الخلية بالمتر والحد الأقصى للذاكرة
+DEFAULT_GRID_CELL_M = 50.0
+DEFAULT_GRID_MAX_BYTES = 256 * 1024 * 1024
+_GRID_BLOCK_PAIRS = 1_000_000
+# المستطيل الداخلي يكلّف مثل ~300-1000 فحص نقطة في المضلع، فيُحسب فقط لزون
+# له هذا العدد من الأزواج المرشحة في دفعة واحدة
+INTERIOR_MIN_HITS = 1024
+
+
+def interior_rectangles(polygons):
+    """مستطيل داخل كل زون بالكامل (minx, miny, maxx, maxy)
+
+    الزون المستطيل يأخذ حدوده كاملة، وغيره يأخذ مربعاً داخل أكبر دائرة داخلية.
+    أي نقطة داخل المستطيل داخل الزون بدون فحص المضلع. NaN = لا يوجد مستطيل.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    rects = np.full((len(polygons), 4), np.nan)
+    usable = shapely.is_valid(polygons) & ~shapely.is_empty(polygons)
+    if not usable.any():
+        return rects
+
+    idx = np.flatnonzero(usable)
+    candidates = shapely.bounds(polygons[idx])
+    is_box = shapely.covers(polygons[idx], shapely.envelope(polygons[idx]))
+
+    others = idx[~is_box]
+    if len(others):
+        circles = shapely.maximum_inscribed_circle(polygons[others])
+        center = shapely.get_coordinates(shapely.get_point(circles, 0))
+        # نصف ضلع المربع داخل الدائرة مع هامش صغير لأخطاء الفاصلة العائمة
+        half = shapely.length(circles) / np.sqrt(2) * 0.999
+        candidates[~is_box] = np.column_stack([
+            center[:, 0] - half, center[:, 1] - half,
+            center[:, 0] + half, center[:, 1] + half
+        ])
+
+    ok = shapely.covers(polygons[idx], shapely.box(*candidates.T))
+    rects[idx[ok]] = candidates[ok]
+    return rects
+
+
+class ZoneGrid:
+    """جدول بحث شبكي محسوب مسبقاً فوق طبقة الزونات
+
+    كل خلية في cells: رقم زون يغطي الخلية بالكامل (>= 0)، أو -1 لا يوجد زون،
+    أو (-2 - k) حيث k رقم قائمة المرشحين (candidates[offsets[k]:offsets[k + 1]]).
+    """
+
+    def __init__(self, bounds, dx, dy, shape, cells, offsets, candidates):
+        self.minx, self.miny, self.maxx, self.maxy = bounds
+        self.dx = dx
+        self.dy = dy
+        self.ny, self.nx = shape
+        self.cells = cells
+        self.offsets = offsets
+        self.candidates = candidates
+
+    @property
+    def nbytes(self):
+        return self.cells.nbytes + self.offsets.nbytes + self.candidates.nbytes
+
+    def cell_boxes(self, cell_ids):
+        """حدود الخلايا (x0, y0, x1, y1) بنفس الحساب المستخدم عند البناء"""
+        iy, ix = np.divmod(cell_ids, self.nx)
+        return (
+            self.minx + ix * self.dx, self.miny + iy * self.dy,
+            self.minx + (ix + 1) * self.dx, self.miny + (iy + 1) * self.dy
+        )
+
+    def lookup(self, xy):
+        """(حالة الخلية لكل نقطة، رقم الخلية، النقاط التي لم يحسمها الجدول)
+
+        النقاط خارج حدود الطبقة حالتها -1 مباشرة. النقاط التي لا تقع داخل
+        خليتها بالضبط (أخطاء التقريب أو قيم غير صالحة) تُرجع في rest للفحص العادي.
+        """
+        x, y = xy[:, 0], xy[:, 1]
+        state = np.full(len(xy), -1, dtype=np.int64)
+        finite = np.isfinite(x) & np.isfinite(y)
+        outside = finite & ((x < self.minx) | (x > self.maxx) | (y < self.miny) | (y > self.maxy))
+
+        ix = np.zeros(len(xy), dtype=np.int64)
+        iy = np.zeros(len(xy), dtype=np.int64)
+        ix[finite] = np.clip(np.floor((x[finite] - self.minx) / self.dx), 0, self.nx - 1)
+        iy[finite] = np.clip(np.floor((y[finite] - self.miny) / self.dy), 0, self.ny - 1)
+        cell = iy * self.nx + ix
+
+        x0, y0, x1, y1 = self.cell_boxes(cell)
+        in_cell = finite & ~outside & (x0 <= x) & (x <= x1) & (y0 <= y) & (y <= y1)
+        state[in_cell] = self.cells[cell[in_cell]]
+        rest = np.flatnonzero(~in_cell & ~outside)
+        return state, cell, rest
+
+
+def build_zone_grid(index, cell_m=DEFAULT_GRID_CELL_M, max_bytes=DEFAULT_GRID_MAX_BYTES):
+    """بناء ZoneGrid من فهرس الزونات، أو None إذا تعدّى الجدول حد الذاكرة
+
+    حجم الخلية يكبر تلقائياً (×2) حتى يأخذ جدول الخلايا نصف الحد فقط،
+    والنصف الثاني لقوائم المرشحين.
+    """
+    polygons = index.polygons
+    if len(polygons) == 0:
+        return None
+    minx, miny, maxx, maxy = shapely.total_bounds(polygons)
+    if not np.isfinite([minx, miny, maxx, maxy]).all():
+        return None
+
+    dy = cell_m / METERS_PER_DEGREE
+    dx = dy / max(math.cos(math.radians((miny + maxy) / 2)), 0.01)
+    while True:
+        nx = max(math.ceil((maxx - minx) / dx), 1)
+        ny = max(math.ceil((maxy - miny) / dy), 1)
+        if nx * ny * 4 <= max_bytes // 2:
+            break
+        dx *= 2
+        dy *= 2
+
+    grid = ZoneGrid(
+        (minx, miny, maxx, maxy), dx, dy, (ny, nx),
+        np.full(nx * ny, -1, dtype=np.int32), None, None
+    )
+
+    # أزواج (خلية، زون) لكل خلية داخل حدود الزون (مع خلية إضافية من كل جهة للتقريب)
+    usable = np.flatnonzero(~shapely.is_empty(polygons))
+    b = shapely.bounds(polygons[usable])
+    ix0 = np.clip(np.floor((b[:, 0] - minx) / dx) - 1, 0, nx - 1).astype(np.int64)
+    ix1 = np.clip(np.floor((b[:, 2] - minx) / dx) + 1, 0, nx - 1).astype(np.int64)
+    iy0 = np.clip(np.floor((b[:, 1] - miny) / dy) - 1, 0, ny - 1).astype(np.int64)
+    iy1 = np.clip(np.floor((b[:, 3] - miny) / dy) + 1, 0, ny - 1).astype(np.int64)
+    widths = ix1 - ix0 + 1
+    sizes = widths * (iy1 - iy0 + 1)
+    if sizes.sum() * 16 > max_bytes:
+        return None
+
+    zone = np.repeat(usable, sizes)
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    w = np.repeat(widths, sizes)
+    cell = (np.repeat(iy0, sizes) + local // w) * nx + np.repeat(ix0, sizes) + local % w
+    del local, w
+
+    # الخلايا التي يمر بها حد الزون تبقى مرشحة. الحد مقسّم بنقاط أقرب من نصف خلية،
+    # فالنقطتان المتتاليتان في نفس الخلية أو خليتين متجاورتين، وعند الانتقال القطري
+    # تُعلَّم الخليتان الجانبيتان أيضاً
+    valid = shapely.is_valid(polygons)
+    starts = np.cumsum(sizes) - sizes
+    on_edge = ~valid[zone]
+
+    def mark(k, cx, cy):
+        cx = np.clip(cx, ix0[k], ix1[k])
+        cy = np.clip(cy, iy0[k], iy1[k])
+        on_edge[starts[k] + (cy - iy0[k]) * widths[k] + cx - ix0[k]] = True
+
+    edges = shapely.segmentize(shapely.boundary(polygons[usable]), min(dx, dy) / 2)
+    xy, k = shapely.get_coordinates(edges, return_index=True)
+    cx = np.floor((xy[:, 0] - minx) / dx).astype(np.int64)
+    cy = np.floor((xy[:, 1] - miny) / dy).astype(np.int64)
+    mark(k, cx, cy)
+    diagonal = np.flatnonzero(
+        (k[1:] == k[:-1]) & (cx[1:] != cx[:-1]) & (cy[1:] != cy[:-1])
+    ) + 1
+    mark(k[diagonal], cx[diagonal - 1], cy[diagonal])
+    mark(k[diagonal], cx[diagonal], cy[diagonal - 1])
+    del xy, k, cx, cy
+
+    # باقي الخلايا إما داخل الزون بالكامل أو خارجه: يكفي فحص منتصفها
+    iy, ix = np.divmod(cell, nx)
+    inside = np.zeros(len(zone), dtype=bool)
+    rest = np.flatnonzero(~on_edge)
+    for start in range(0, len(rest), _GRID_BLOCK_PAIRS):
+        block = rest[start:start + _GRID_BLOCK_PAIRS]
+        inside[block] = shapely.contains_xy(
+            polygons[zone[block]],
+            minx + (ix[block] + 0.5) * dx,
+            miny + (iy[block] + 0.5) * dy
+        )
+    keep = on_edge | inside
+    cell, zone, inside = cell[keep], zone[keep], inside[keep]
+
+    # خلية بزون واحد يغطيها بالكامل = نتيجة مباشرة، وغير ذلك قائمة مرشحين
+    counts = np.bincount(cell, minlength=nx * ny)
+    full = inside & (counts[cell] == 1)
+    grid.cells[cell[full]] = zone[full]
+
+    cell, zone = cell[~full], zone[~full]
+    order = np.lexsort((zone, cell))
+    cell, zone = cell[order], zone[order]
+    cand_cells, lengths = np.unique(cell, return_counts=True)
+    grid.cells[cand_cells] = -2 - np.arange(len(cand_cells))
+    grid.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    grid.candidates = zone.astype(np.int32)
+    if grid.nbytes > max_bytes:
+        return None
+    return grid
+
+
+class ZoneIndex(STRtree):
+    """STRtree للزونات مع هندسات مُجهّزة (prepared) وأعمدة NumPy للبحث السريع
+
+    يُستخدم مكان STRtree في كل مكان (query / query_nearest كما هي).
+    """
+
+    def __init__(self, df, interior=None, interior_known=None):
+        polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+        super().__init__(polygons)
+        # نفس كائنات الهندسة الموجودة في df["polygon"]، فتجهيزها يسرّع covers في كل مكان
+        shapely.prepare(polygons)
+        self.polygons = polygons
+        self.polygon_id = df["polygon_id"].to_numpy(dtype=np.int64)
+        self.square_number = df["square_number"].to_numpy(dtype=object)
+        self.sign_number = df["sign_number"].to_numpy(dtype=object)
+        # المستطيلات الداخلية تُحسب لكل زون عند الحاجة فقط (interior_for)
+        if interior is None:
+            self._interior = np.full((len(polygons), 4), np.nan)
+            self._interior_known = np.zeros(len(polygons), dtype=bool)
+        else:
+            self._interior = np.array(interior, dtype=float)
+            self._interior_known = (np.ones(len(polygons), dtype=bool) if interior_known is None
+                                    else np.array(interior_known, dtype=bool))
+        self._grid_config = None
+        self._grid = None
+        self._lock = threading.Lock()
+
+    def enable_grid(self, cell_m=DEFAULT_GRID_CELL_M, max_bytes=DEFAULT_GRID_MAX_BYTES):
+        """تفعيل جدول البحث الشبكي (يُبنى عند أول بحث نقاط)"""
+        with self._lock:
+            if self._grid_config != (cell_m, max_bytes):
+                self._grid_config = (cell_m, max_bytes)
+                self._grid = None
+
+    @property
+    def grid_config(self):
+        """(حجم الخلية، حد الذاكرة) للجدول الشبكي أو None"""
+        return self._grid_config
+
+    @property
+    def grid(self):
+        """ZoneGrid المفعّل، أو None إذا لم يُفعّل أو تعدّى حد الذاكرة"""
+        with self._lock:
+            if self._grid_config is None:
+                return None
+            if self._grid is None:
+                self._grid = build_zone_grid(self, *self._grid_config) or False
+            return self._grid or None
+
+    @property
+    def interior(self):
+        """مستطيلات داخلية لكل زون (يحسب كل ما لم يُحسب بعد)"""
+        return self.interior_for(np.arange(len(self.polygons)))
+
+    @property
+    def interior_state(self):
+        """(المستطيلات، المحسوب منها) كما هي الآن، NaN للزونات التي لم تُحسب"""
+        return self._interior, self._interior_known
+
+    def interior_for(self, zone_idx):
+        """المستطيلات الداخلية للزونات zone_idx، مع حساب وحفظ ما لم يُحسب منها"""
+        zone_idx = np.asarray(zone_idx, dtype=np.int64)
+        missing = np.unique(zone_idx[~self._interior_known[zone_idx]])
+        if len(missing):
+            with self._lock:
+                missing = missing[~self._interior_known[missing]]
+                self._interior[missing] = interior_rectangles(self.polygons[missing])
+                self._interior_known[missing] = True
+        return self._interior[zone_idx]
+
+    def _interior_rects(self, zone_idx):
+        """المستطيلات لأزواج مرشحة: المحفوظة، مع حساب الزونات التي لها INTERIOR_MIN_HITS زوج أو أكثر"""
+        rects, known = self.interior_state
+        hits = np.bincount(zone_idx, minlength=len(known))
+        wanted = np.flatnonzero((hits >= INTERIOR_MIN_HITS) & ~known)
+        if len(wanted):
+            self.interior_for(wanted)
+            rects = self.interior_state[0]
+        return rects[zone_idx]
+
+    def covering_pairs(self, points):
+        """أزواج (رقم النقطة، رقم الزون) لكل زون يغطي النقطة، بدون ترتيب"""
+        points = np.asarray(points, dtype=object)
+        return self.covering_pairs_xy(shapely.get_x(points), shapely.get_y(points))
+
+    def covering_pairs_xy(self, x, y):
+        """نفس covering_pairs لكن من مصفوفتي الإحداثيات مباشرة (بدون إنشاء نقاط)
+
+        مع جدول البحث الشبكي: الخلية الفارغة أو المغطاة بزون واحد تُحسم مباشرة،
+        وخلايا الحدود تُفحص ضد قائمة مرشحيها فقط. بدونه: المرشحين من الفهرس
+        بالـ bounding box.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        grid = self.grid
+        if grid is None:
+            return self._covering_candidates(x, y, *self.query(shapely.points(x, y)))
+
+        state, _, rest = grid.lookup(np.column_stack([x, y]))
+        full = np.flatnonzero(state >= 0)
+        pairs = [np.vstack([full, state[full]])]
+
+        # خلايا الحدود: كل نقطة مع قائمة مرشحي خليتها
+        cand_points = np.flatnonzero(state <= -2)
+        k = -2 - state[cand_points]
+        starts = grid.offsets[k]
+        lengths = grid.offsets[k + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        pairs.append(self._covering_candidates(
+            x, y, np.repeat(cand_points, lengths), grid.candidates[positions].astype(np.int64)
+        ))
+
+        if len(rest):
+            point_idx, zone_idx = self._covering_candidates(
+                x[rest], y[rest], *self.query(shapely.points(x[rest], y[rest]))
+            )
+            pairs.append(np.vstack([rest[point_idx], zone_idx]))
+        return np.hstack(pairs)
+
+    def _covering_candidates(self, x, y, point_idx, zone_idx):
+        """تصفية أزواج مرشحة: المستطيل الداخلي أولاً، ثم المضلع المُجهّز للباقي"""
+        px = x[point_idx]
+        py = y[point_idx]
+        rect = self._interior_rects(zone_idx)
+        # المقارنة مع NaN دائماً False، فالزون بدون مستطيل يذهب للفحص الكامل
+        inside = (rect[:, 0] <= px) & (px <= rect[:, 2]) & (rect[:, 1] <= py) & (py <= rect[:, 3])
+
+        # النقطة "تتقاطع" مع المضلع = داخله أو على حدوده (نفس covers)
+        rest = np.flatnonzero(~inside)
+        inside[rest] = shapely.intersects_xy(self.polygons[zone_idx[rest]], px[rest], py[rest])
+        return np.vstack([point_idx[inside], zone_idx[inside]])
+
+
+class OverlayZoneIndex(ZoneIndex):
+    """فهرس طبقة معدّلة: الفهرس الأساسي (مع الزونات المحذوفة مُعلّمة) + فهرس صغير للزونات الجديدة
+
+    ترتيب الزونات: الزونات الباقية من الأساسي بنفس ترتيبها، ثم الجديدة.
+    لا يُبنى STRtree جديد للطبقة كاملة (انظر ZoneStore.compact).
+    """
+
+    def __init__(self, base, alive, overlay):
+        # بدون STRtree.__init__: كل عمليات البحث تمر على الفهرسين
+        self.base = base
+        self.overlay = overlay
+        self.alive = alive
+        self.n_base = int(alive.sum())
+        self.base_to_current = np.where(alive, np.cumsum(alive) - 1, -1)
+
+        keep = np.flatnonzero(alive)
+        self.keep = keep
+        self.polygons = np.concatenate([base.polygons[keep], overlay.polygons])
+        self.polygon_id = np.concatenate([base.polygon_id[keep], overlay.polygon_id])
+        self.square_number = np.concatenate([base.square_number[keep], overlay.square_number])
+        self.sign_number = np.concatenate([base.sign_number[keep], overlay.sign_number])
+        self._grid_config = None
+        self._grid = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.polygons)
+
+    @property
+    def geometries(self):
+        return self.polygons
+
+    @property
+    def interior_state(self):
+        rects, known = self.base.interior_state
+        over_rects, over_known = self.overlay.interior_state
+        return (np.concatenate([rects[self.keep], over_rects]),
+                np.concatenate([known[self.keep], over_known]))
+
+    def interior_for(self, zone_idx):
+        # المستطيلات تُحفظ في الفهرسين، فتبقى بعد كل تعديل
+        zone_idx = np.asarray(zone_idx, dtype=np.int64)
+        rects = np.empty((len(zone_idx), 4))
+        from_base = zone_idx < self.n_base
+        rects[from_base] = self.base.interior_for(self.keep[zone_idx[from_base]])
+        rects[~from_base] = self.overlay.interior_for(zone_idx[~from_base] - self.n_base)
+        return rects
+
+    @property
+    def grid(self):
+        # الجدول الشبكي يُبنى فقط بعد الدمج (compact) حتى لا يُعاد بناؤه مع كل تعديل
+        return None
+
+    def _from_base(self, point_idx, zone_idx):
+        current = self.base_to_current[zone_idx]
+        keep = current >= 0
+        return point_idx[keep], current[keep]
+
+    def query(self, geometry, predicate=None, distance=None):
+        base = self.base.query(geometry, predicate=predicate, distance=distance)
+        over = self.overlay.query(geometry, predicate=predicate, distance=distance)
+        if base.ndim == 1:
+            current = self.base_to_current[base]
+            return np.concatenate([current[current >= 0], over + self.n_base])
+        point_idx, zone_idx = self._from_base(base[0], base[1])
+        return np.hstack([
+            np.vstack([point_idx, zone_idx]),
+            np.vstack([over[0], over[1] + self.n_base])
+        ])
+
+    def query_nearest(self, geometry, return_distance=False):
+        """أقرب زون (أو أكثر عند التساوي) لكل هندسة، بنفس شكل STRtree.query_nearest"""
+        geometry = np.atleast_1d(np.asarray(geometry, dtype=object))
+        parts = []
+
+        if len(self.base.polygons):
+            (p, t), d = self.base.query_nearest(geometry, return_distance=True)
+            current = self.base_to_current[t]
+            ok = current >= 0
+            parts.append((p[ok], current[ok], d[ok]))
+
+            # نقاط أقرب زون لها محذوف: توسيع البحث حتى نجد زوناً باقياً
+            pending = np.setdiff1d(p[~ok], p[ok])
+            if len(pending) and self.n_base:
+                dead_distance = np.full(len(geometry), np.inf)
+                np.minimum.at(dead_distance, p[~ok], d[~ok])
+                parts.append(self._nearest_alive(geometry, pending, dead_distance[pending]))
+
+        if len(self.overlay.polygons):
+            (p, t), d = self.overlay.query_nearest(geometry, return_distance=True)
+            parts.append((p, t + self.n_base, d))
+
+        p = np.concatenate([part[0] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+        t = np.concatenate([part[1] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+        d = np.concatenate([part[2] for part in parts]) if parts else np.empty(0)
+
+        best = np.full(len(geometry), np.inf)
+        np.minimum.at(best, p, d)
+        keep = d <= best[p]
+        order = np.lexsort((t[keep], p[keep]))
+        result = np.vstack([p[keep][order], t[keep][order]])
+        return (result, d[keep][order]) if return_distance else result
+
+    def _nearest_alive(self, geometry, pending, dead_distance):
+        """أقرب زون باقٍ من الأساسي لنقاط أقرب زون لها محذوف
+
+        البحث في حلقة حول مسافة الزون المحذوف لكل نقطة، وعرض الحلقة يتضاعف حتى
+        نجد زوناً باقياً.
+        """
+        minx, miny, maxx, maxy = shapely.total_bounds(self.base.polygons)
+        span = max(np.hypot(maxx - minx, maxy - miny), 1e-9)
+        step = span / 4096
+        parts = []
+        while len(pending):
+            p, t = self.base.query(
+                geometry[pending], predicate="dwithin", distance=dead_distance + step
+            )
+            p, current = self._from_base(p, t)
+            if len(p):
+                d = shapely.distance(geometry[pending][p], self.polygons[current])
+                parts.append((pending[p], current, d))
+                left = ~np.isin(np.arange(len(pending)), p)
+                pending, dead_distance = pending[left], dead_distance[left]
+            if step > span * 4:
+                break
+            step *= 2
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return tuple(np.concatenate(x) for x in zip(*parts))
@@ -0,0 +1,158 @@
+# ======================================================
+# تقدم وإلغاء وقياس أداء المهام الطويلة
+# ======================================================
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+
+class JobCancelled(Exception):
+    """المهمة أُلغيت (JobMonitor.cancel) قبل أن تنتهي"""
+
+
+class RssSampler:
+    """قياس أعلى استهلاك للذاكرة (RSS) أثناء مرحلة واحدة بأخذ عينات من /proc"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            pass
+        try:
+            # بدون /proc: أعلى قيمة منذ بداية العملية (KB على Linux)
+            import resource
+        except ImportError:
+            # Windows: لا يوجد resource، والذاكرة لا تُقاس (0)
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+class JobMonitor:
+    """تقدم مهمة طويلة مع إمكانية الإلغاء وقياس كل مرحلة (زمن، عناصر/ثانية، أعلى ذاكرة)
+
+    progress(stage, done, total): يُستدعى بحد أقصى مرة كل min_interval ثانية
+    (وعند اكتمال المرحلة)، و total قد يكون None.
+    الدوال الطويلة تستدعي update / advance فقط؛ المراحل يفتحها المستدعي بـ stage().
+    """
+
+    def __init__(self, name="job", progress=None, min_interval=0.25, sample_memory=True):
+        self.name = name
+        self.progress = progress
+        self.min_interval = min_interval
+        self.sample_memory = sample_memory
+        self.started = datetime.now(timezone.utc)
+        self.stages = []
+        self._cancel = threading.Event()
+        self._current = None
+        self._done = 0
+        self._last_report = 0.0
+        self._reported = None
+
+    def cancel(self):
+        """طلب الإلغاء: أول update / advance بعدها يرفع JobCancelled"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"تم إلغاء {self.name}")
+
+    @contextmanager
+    def stage(self, name, items=None):
+        """قياس مرحلة واحدة؛ يرجع سجل المرحلة (يمكن تعديل items داخله)"""
+        self.check()
+        record = {"stage": name, "items": items, "status": "running"}
+        self._current = record
+        self._done = 0
+        self._last_report = 0.0
+        self._reported = None
+        sampler = RssSampler() if self.sample_memory else nullcontext()
+        started = time.perf_counter()
+        try:
+            with sampler:
+                yield record
+            record["status"] = "done"
+        except JobCancelled:
+            record["status"] = "cancelled"
+            raise
+        except Exception:
+            record["status"] = "failed"
+            raise
+        except BaseException:
+            # KeyboardInterrupt أو إيقاف التشغيل من الواجهة (مثل rerun في Streamlit)
+            record["status"] = "cancelled"
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            if record["items"] is None and self._done:
+                record["items"] = self._done
+            items = record["items"]
+            record["seconds"] = round(seconds, 3)
+            record["items_per_s"] = round(items / seconds, 1) if items and seconds > 0 else None
+            # None إذا لم تُقَس الذاكرة (معطّل أو غير متاح على النظام)
+            peak = sampler.peak if self.sample_memory else 0
+            record["peak_rss_mb"] = round(peak / 2**20, 1) if peak else None
+            self.stages.append(record)
+            self._current = None
+
+    def update(self, done, total=None):
+        """التقدم داخل المرحلة الحالية (total الافتراضي = items المرحلة)"""
+        self.check()
+        self._done = done
+        if self.progress is None:
+            return
+        if total is None and self._current is not None:
+            total = self._current["items"]
+        now = time.perf_counter()
+        finished = total is not None and done >= total and done != self._reported
+        if finished or now - self._last_report >= self.min_interval:
+            self._last_report = now
+            self._reported = done
+            stage = self._current["stage"] if self._current is not None else self.name
+            self.progress(stage, done, total)
+
+    def advance(self, n=1, total=None):
+        """زيادة التقدم بـ n عنصر"""
+        self.update(self._done + n, total)
+
+    def report(self):
+        """ملخص المهمة كقاموس (للعرض أو التصدير كـ JSON)"""
+        return {
+            "job": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "total_seconds": round(sum(s["seconds"] for s in self.stages), 3),
+            "cancelled": self.cancelled or any(s["status"] == "cancelled" for s in self.stages),
+            "stages": list(self.stages)
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.report(), ensure_ascii=False, **kwargs)
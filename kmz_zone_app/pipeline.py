@@ -0,0 +1,377 @@
+# ======================================================
+# معالجة ملفات النقاط الكبيرة على دفعات وعلى عدة أنوية
+# ======================================================
+import os
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook, load_workbook
+
+from .zones import compile_zones, load_compiled_zones, zones_export_frame
+from .index import DEFAULT_GRID_MAX_BYTES
+from .points import DEFAULT_PRIORITY_COLUMN, run_points_test, add_nearest_zone_columns, _zone_priority
+
+
+POINT_FILE_TYPES = ("xlsx", "csv", "parquet")
+DEFAULT_CHUNK_SIZE = 200_000
+
+TABLE_MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/octet-stream"
+}
+# عند اختيار الصيغة تلقائياً: xlsx حتى هذا العدد من الصفوف، و csv للأكبر
+XLSX_AUTO_MAX_ROWS = 200_000
+# حد Excel للصفوف (بدون سطر العناوين)
+XLSX_MAX_ROWS = 1_048_575
+# عدد الصفوف بين تحديثات التقدم عند كتابة جدول
+TABLE_WRITE_CHUNK = 100_000
+
+
+def _source_ext(source):
+    """امتداد الملف (xlsx / csv / parquet) من المسار أو اسم الملف المرفوع"""
+    name = source if isinstance(source, (str, os.PathLike)) else source.name
+    return os.path.splitext(str(name))[1].lower().lstrip(".")
+
+
+def _rewind(source):
+    """إرجاع مؤشر الملف المرفوع للبداية قبل قراءة جديدة"""
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def auto_table_format(n_rows):
+    """صيغة ملف النتائج حسب الحجم: xlsx للجداول الصغيرة و csv للكبيرة"""
+    return "xlsx" if n_rows <= XLSX_AUTO_MAX_ROWS else "csv"
+
+
+def _iter_xlsx_rows(source):
+    """صفوف أول ورقة (العناوين أولاً) بوضع القراءة فقط بدون تحميل الملف كاملاً"""
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            if all(v is None for v in row):
+                continue
+            yield row
+    finally:
+        wb.close()
+
+
+def _read_xlsx(source):
+    rows = _iter_xlsx_rows(source)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    return pd.DataFrame(list(rows), columns=header)
+
+
+def _write_xlsx(df, target, monitor=None):
+    """كتابة xlsx بوضع الكتابة فقط (صف بعد صف بدون بناء الخلايا في الذاكرة)"""
+    if len(df) > XLSX_MAX_ROWS:
+        raise ValueError(f"عدد الصفوف ({len(df)}) أكبر من حد Excel، استخدم csv أو parquet")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(c) for c in df.columns])
+    # عمود عمود إلى قيم Python (NaN ← خلية فارغة كما في to_excel)
+    columns = [
+        df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns
+    ]
+    for i, row in enumerate(zip(*columns), 1):
+        ws.append(row)
+        if monitor is not None and i % TABLE_WRITE_CHUNK == 0:
+            monitor.update(i, len(df))
+    wb.save(target)
+
+
+def read_points_table(source):
+    """قراءة ملف نقاط كامل (xlsx / csv / parquet) في DataFrame واحد"""
+    ext = _source_ext(source)
+    _rewind(source)
+    if ext == "csv":
+        return pd.read_csv(source)
+    if ext == "parquet":
+        return pd.read_parquet(source)
+    return _read_xlsx(source)
+
+
+def _write_csv(df, target, monitor=None):
+    """كتابة csv على دفعات من TABLE_WRITE_CHUNK صف (العناوين في الدفعة الأولى فقط)"""
+    if monitor is None or len(df) <= TABLE_WRITE_CHUNK:
+        df.to_csv(target, index=False)
+    else:
+        for start in range(0, len(df), TABLE_WRITE_CHUNK):
+            # المسار يُفتح للإضافة بعد الدفعة الأولى، و file-like يتقدم مؤشره وحده
+            df.iloc[start:start + TABLE_WRITE_CHUNK].to_csv(
+                target, mode="w" if start == 0 else "a", header=start == 0, index=False
+            )
+            monitor.update(min(start + TABLE_WRITE_CHUNK, len(df)), len(df))
+
+
+def write_points_table(df, target, file_format=None, monitor=None):
+    """كتابة جدول نتائج (xlsx / csv / parquet)
+
+    target: مسار (الصيغة من الامتداد) أو file-like مع file_format.
+    monitor (JobMonitor اختياري): التقدم بعدد الصفوف المكتوبة في xlsx و csv.
+    """
+    ext = file_format or _source_ext(target)
+    if ext == "csv":
+        _write_csv(df, target, monitor)
+    elif ext == "parquet":
+        pq.write_table(_frame_to_arrow(df), target)
+    elif ext == "xlsx":
+        _write_xlsx(df, target, monitor)
+    else:
+        raise ValueError(f"صيغة ملف النتائج غير مدعومة: {ext}")
+    if monitor is not None:
+        monitor.update(len(df), len(df))
+
+
+def write_zones_table(df, target, file_format=None, source_name="", monitor=None):
+    """تصدير طبقة الزونات كجدول
+
+    xlsx / csv: coordinates و Center كنص JSON (قابل للرفع كملف Excel للزونات)،
+    parquet: ملف زونات مجمّع بأنواع أصلية (هندسة WKB و center_lon / center_lat).
+    """
+    ext = file_format or _source_ext(target)
+    if ext == "parquet":
+        compile_zones(df, target, source_name=source_name)
+    else:
+        write_points_table(zones_export_frame(df), target, ext, monitor)
+
+
+def count_point_rows(source):
+    """عدد النقاط في الملف بدون قراءته كـ DataFrame (None إذا تعذر معرفته)"""
+    ext = _source_ext(source)
+    _rewind(source)
+    if ext == "parquet":
+        return pq.ParquetFile(source).metadata.num_rows
+    if ext == "xlsx":
+        wb = load_workbook(source, read_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max_row - 1 if max_row else None
+    if ext == "csv":
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                lines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+        else:
+            lines = source.getvalue().count(b"\n")
+        return max(lines - 1, 0)
+    return None
+
+
+def iter_point_chunks(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """قراءة ملف نقاط (xlsx / csv / parquet) على دفعات من DataFrames"""
+    ext = _source_ext(source)
+    _rewind(source)
+
+    if ext == "csv":
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif ext == "parquet":
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif ext == "xlsx":
+        rows = _iter_xlsx_rows(source)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    else:
+        raise ValueError(f"نوع ملف النقاط غير مدعوم: {ext}")
+
+
+def _frame_to_arrow(df):
+    """تحويل جدول النتائج إلى Arrow مع جعل العواميد النصية/المختلطة نصاً ثابت النوع"""
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if col.dtype == object or pd.api.types.is_string_dtype(col):
+            columns[str(name)] = pa.array(
+                [None if pd.isna(v) else str(v) for v in col], type=pa.string()
+            )
+        else:
+            columns[str(name)] = pa.array(col.to_numpy(), from_pandas=True)
+    return pa.table(columns)
+
+
+# ======================================================
+# العمل داخل كل عملية (process)
+# ======================================================
+_worker_layer = None
+
+
+def _init_worker(zones_path, grid_cell_m=None, grid_max_bytes=DEFAULT_GRID_MAX_BYTES,
+                 extra_columns=None):
+    """تحميل طبقة الزونات مرة واحدة لكل عملية من الملف المجمّع (memory map)
+
+    extra_columns: عواميد لا يحفظها الملف المجمّع (مثل عامود الأولوية) بنفس ترتيب الزونات.
+    """
+    global _worker_layer
+    _worker_layer = load_compiled_zones(zones_path)
+    for name, values in (extra_columns or {}).items():
+        _worker_layer[0][name] = values
+    if grid_cell_m:
+        _worker_layer[1].enable_grid(grid_cell_m, grid_max_bytes)
+
+
+def _process_chunk(chunk_no, chunk, parts_dir, nearest_mode, test_options):
+    """فحص دفعة نقاط وكتابة نتيجتها مباشرة على القرص"""
+    df, spatial_index = _worker_layer
+    out = run_points_test(chunk, df, spatial_index, **test_options)
+    if nearest_mode:
+        out = add_nearest_zone_columns(out, df, spatial_index, nearest_mode)
+
+    path = os.path.join(parts_dir, f"part-{chunk_no:06d}.parquet")
+    pq.write_table(_frame_to_arrow(out), path)
+    # عدد النقاط وعدد صفوف النتيجة (أكثر مع explode)
+    return chunk_no, len(chunk), len(out), path
+
+
+def _is_number_type(t):
+    return pa.types.is_integer(t) or pa.types.is_floating(t)
+
+
+def _unify_part_schemas(schemas):
+    """مخطط واحد لكل الدفعات
+
+    read_csv يخمّن نوع كل عامود لكل دفعة وحدها، فقد يكون square_number رقماً في
+    دفعة ونصاً في أخرى: أي عامود بأنواع مختلفة (غير رقمية فقط) يصبح نصاً،
+    والأرقام تُوسّع (int ← float) كالمعتاد.
+    """
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            if not pa.types.is_null(field.type):
+                types.setdefault(field.name, set()).add(field.type)
+    as_text = {
+        name for name, found in types.items()
+        if len(found) > 1 and not all(_is_number_type(t) for t in found)
+    }
+    schemas = [
+        pa.schema([f.with_type(pa.string()) if f.name in as_text else f for f in schema])
+        for schema in schemas
+    ]
+    return pa.unify_schemas(schemas, promote_options="permissive")
+
+
+def _merge_parts(part_paths, output_path):
+    """دمج ملفات الدفعات بالترتيب في ملف نتائج واحد (parquet أو csv)"""
+    ext = _source_ext(output_path)
+
+    if ext == "parquet":
+        schema = _unify_part_schemas([pq.read_schema(p) for p in part_paths])
+        with pq.ParquetWriter(output_path, schema) as writer:
+            for p in part_paths:
+                writer.write_table(pq.read_table(p).select(schema.names).cast(schema))
+    elif ext == "csv":
+        for i, p in enumerate(part_paths):
+            pq.read_table(p).to_pandas().to_csv(
+                output_path, mode="w" if i == 0 else "a", header=i == 0, index=False
+            )
+    else:
+        raise ValueError(f"صيغة ملف النتائج غير مدعومة: {ext}")
+
+
+def run_points_pipeline(points_source, df, output_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                        workers=None, nearest_mode=None, progress=None,
+                        grid_cell_m=None, grid_max_bytes=DEFAULT_GRID_MAX_BYTES, monitor=None,
+                        policy="first", priority_column=DEFAULT_PRIORITY_COLUMN, explode=False,
+                        tolerance_m=0.0):
+    """فحص ملف نقاط كبير على دفعات بالتوازي وكتابة النتائج إلى output_path
+
+    طبقة الزونات تُكتب مرة واحدة كملف مجمّع وتُقرأ في كل عملية (بدون pickle لكل دفعة).
+    nearest_mode: إذا تم تحديده ("center" أو "boundary") يُضاف أقرب زون للنقاط 3 و 4.
+    progress(done_chunks, total_chunks): يُستدعى بعد كل دفعة (total_chunks قد يكون None).
+    grid_cell_m: تفعيل جدول البحث الشبكي في كل عملية بهذا الحجم للخلية (متر).
+    monitor (JobMonitor اختياري): التقدم بعدد الصفوف؛ عند الإلغاء تُلغى الدفعات
+    التي لم تبدأ وينتظر فقط ما يعمل حالياً، ثم يُرفع JobCancelled.
+    policy / priority_column / explode / tolerance_m: كما في run_points_test.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    test_options = {
+        "policy": policy,
+        "priority_column": priority_column,
+        "explode": explode,
+        "tolerance_m": tolerance_m
+    }
+    # عامود الأولوية يُفحص هنا ويُرسل للعمليات مع الطبقة
+    extra_columns = (
+        {priority_column: _zone_priority(df, priority_column)} if policy == "priority" else None
+    )
+
+    total_rows = count_point_rows(points_source)
+    total_chunks = -(-total_rows // chunk_size) if total_rows is not None else None
+
+    with tempfile.TemporaryDirectory(prefix="kmz_zone_") as tmp:
+        zones_path = os.path.join(tmp, "zones.parquet")
+        compile_zones(df, zones_path)
+
+        parts = {}
+        rows_done = 0
+        output_rows = 0
+
+        def collect(done):
+            nonlocal rows_done, output_rows
+            for future in done:
+                chunk_no, rows, out_rows, path = future.result()
+                parts[chunk_no] = path
+                rows_done += rows
+                output_rows += out_rows
+                if progress is not None:
+                    progress(len(parts), total_chunks)
+                if monitor is not None:
+                    monitor.update(rows_done, total_rows)
+
+        # spawn: عمليات نظيفة لا ترث خيوط (threads) الواجهة
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(zones_path, grid_cell_m, grid_max_bytes, extra_columns)
+        ) as pool:
+            pending = set()
+            try:
+                for chunk_no, chunk in enumerate(iter_point_chunks(points_source, chunk_size)):
+                    if monitor is not None:
+                        monitor.check()
+                    # حد أقصى للدفعات المنتظرة حتى لا تمتلئ الذاكرة
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(
+                        _process_chunk, chunk_no, chunk, tmp, nearest_mode, test_options
+                    ))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            except BaseException:
+                # إلغاء / KeyboardInterrupt / إيقاف الواجهة: لا ننتظر الدفعات التي لم تبدأ
+                for future in pending:
+                    future.cancel()
+                raise
+
+        _merge_parts([parts[i] for i in sorted(parts)], output_path)
+
+    return {
+        "rows": rows_done,
+        "output_rows": output_rows,
+        "chunks": len(parts),
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+        "output": str(output_path)
+    }
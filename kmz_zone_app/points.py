@@ -0,0 +1,543 @@
+# ======================================================
+# فحص النقاط ضد الزونات
+# ======================================================
+import json
+import pandas as pd
+import numpy as np
+import shapely
+import pyarrow as pa
+
+from shapely.strtree import STRtree
+
+from .geo import EARTH_RADIUS_M, haversine_m
+from .index import ZoneIndex
+from .zones import _json_lists
+
+
+def find_point(point, df, spatial_index):
+    """إيجاد الزونات التي تحتوي نقطة"""
+    if isinstance(spatial_index, ZoneIndex):
+        zone_idx = np.sort(spatial_index.covering_pairs([point])[1])
+        return [
+            {"polygon_id": int(pid), "square_number": sq, "sign_number": sg}
+            for pid, sq, sg in zip(
+                spatial_index.polygon_id[zone_idx].tolist(),
+                spatial_index.square_number[zone_idx].tolist(),
+                spatial_index.sign_number[zone_idx].tolist()
+            )
+        ]
+
+    results = []
+    for idx in spatial_index.query(point):
+        poly = df.iloc[idx]["polygon"]
+        if poly.covers(point):
+            row = df.iloc[idx]
+            results.append({
+                "polygon_id": int(row["polygon_id"]),
+                "square_number": row["square_number"],
+                "sign_number": row["sign_number"]
+            })
+    return results
+
+def find_points_bulk(lons, lats, df, spatial_index):
+    """إيجاد الزونات التي تحتوي مجموعة نقاط دفعة واحدة
+
+    ترجع مصفوفة بشكل (2, n): الصف الأول رقم النقطة والثاني رقم الزون (موقعه في df)،
+    مرتبة حسب النقطة ثم الزون.
+    """
+    if isinstance(spatial_index, ZoneIndex):
+        pairs = spatial_index.covering_pairs_xy(lons, lats)
+    else:
+        points = shapely.points(
+            np.asarray(lons, dtype=float),
+            np.asarray(lats, dtype=float)
+        )
+        # covered_by تعني: النقطة مغطاة بالزون (نفس poly.covers(point))
+        pairs = spatial_index.query(points, predicate="covered_by")
+    order = np.lexsort((pairs[1], pairs[0]))
+    return pairs[:, order]
+
+def compare_zone_data(point_square, point_sign, zone_data):
+    """مقارنة بيانات النقطة مع بيانات الزون"""
+    if not zone_data:  # لا يوجد زونات
+        return None, None, 4
+    
+    zone = zone_data[0]  # نأخذ أول زون (في حالة تعدد الزونات)
+    zone_square = zone.get("square_number", "")
+    zone_sign = zone.get("sign_number", "")
+    
+    cmp_sign = "T" if str(point_sign) == str(zone_sign) else "F"
+    cmp_square = "T" if str(point_square) == str(zone_square) else "F"
+    
+    # تحديد CMP_Result
+    if cmp_sign == "T":
+        cmp_result = 1
+    elif cmp_square == "T" and cmp_sign == "F":
+        cmp_result = 2
+    elif cmp_square == "F":
+        cmp_result = 3
+    else:
+        cmp_result = 3
+    
+    return cmp_sign, cmp_square, cmp_result
+
+
+def _as_str_array(values):
+    """تحويل عامود إلى نصوص بنفس نتيجة str() لكل قيمة"""
+    return np.asarray(values, dtype=object).astype(str)
+
+
+def _pair_matches(point_square, point_sign, pairs, df):
+    """(same_square, same_sign) لكل زوج (نقطة، زون) من ناتج find_points_bulk"""
+    point_idx, zone_idx = pairs
+    same_square = (
+        _as_str_array(point_square)[point_idx] == _as_str_array(df["square_number"])[zone_idx]
+    )
+    same_sign = _as_str_array(point_sign)[point_idx] == _as_str_array(df["sign_number"])[zone_idx]
+    return same_square, same_sign
+
+
+def _cmp_result(same_square, same_sign):
+    """CMP_Result لكل زوج: 1 تطابق sign، 2 تطابق square فقط، 3 لا تطابق"""
+    return np.select([same_sign, same_square], [1, 2], default=3)
+
+
+def compare_zone_data_bulk(point_square, point_sign, pairs, df):
+    """نسخة متجهة من compare_zone_data تعمل على ناتج find_points_bulk
+
+    ترجع (cmp_sign, cmp_square, cmp_result) كمصفوفات بطول عدد النقاط.
+    المقارنة مع أول زون لكل نقطة (انظر order_zone_pairs لاختيار هذا الزون).
+    """
+    n = len(point_square)
+    point_idx = pairs[0]
+
+    # أول زون لكل نقطة (في حالة تعدد الزونات)
+    matched, first = np.unique(point_idx, return_index=True)
+    same_square, same_sign = _pair_matches(point_square, point_sign, pairs[:, first], df)
+
+    cmp_sign = np.full(n, "", dtype=object)
+    cmp_square = np.full(n, "", dtype=object)
+    cmp_result = np.full(n, 4, dtype=np.int64)
+
+    cmp_sign[matched] = np.where(same_sign, "T", "F")
+    cmp_square[matched] = np.where(same_square, "T", "F")
+    cmp_result[matched] = _cmp_result(same_square, same_sign)
+
+    return cmp_sign, cmp_square, cmp_result
+
+
+# اختيار الزون عند وقوع النقطة في أكثر من زون:
+# first: الأقدم في الطبقة (أصغر موقع)، match: الزون الذي يطابق sign ثم square،
+# smallest: الأصغر مساحة، priority: أصغر قيمة في عامود الأولوية (الفارغ أخيراً)
+ZONE_POLICIES = ("first", "match", "smallest", "priority")
+DEFAULT_PRIORITY_COLUMN = "priority"
+
+
+def _zone_priority(df, priority_column):
+    """عامود الأولوية كأرقام (NaN للقيم الفارغة)"""
+    if priority_column not in df.columns:
+        raise ValueError(f"العامود {priority_column} مفقود في طبقة الزونات")
+    try:
+        return pd.to_numeric(df[priority_column]).to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError(f"العامود {priority_column} يجب أن يحتوي على أرقام")
+
+
+def order_zone_pairs(pairs, df, point_square, point_sign, policy="first",
+                     priority_column=DEFAULT_PRIORITY_COLUMN):
+    """ترتيب ناتج find_points_bulk حسب policy (انظر ZONE_POLICIES)
+
+    الزون المختار يصبح الأول لكل نقطة، والتعادل يُحسم بموقع الزون في الطبقة
+    فالنتيجة لا تعتمد على ترتيب الفهرس المكاني.
+    """
+    if policy not in ZONE_POLICIES:
+        raise ValueError(f"طريقة غير معروفة لاختيار الزون: {policy}")
+    point_idx, zone_idx = pairs
+    if policy == "first" or len(point_idx) == 0:
+        return pairs
+
+    if policy == "match":
+        same_square, same_sign = _pair_matches(point_square, point_sign, pairs, df)
+        key = _cmp_result(same_square, same_sign)
+    elif policy == "smallest":
+        key = df["Area"].to_numpy(dtype=float)[zone_idx]
+    else:
+        key = _zone_priority(df, priority_column)[zone_idx]
+
+    order = np.lexsort((zone_idx, key, point_idx))
+    return pairs[:, order]
+
+
+def _explode_zone_rows(out_df, pairs, df):
+    """صف لكل (نقطة، زون) مع المقارنة لكل صف، والنقطة بدون زون في صف واحد (CMP_Result = 4)"""
+    n = len(out_df)
+    point_idx, zone_idx = pairs
+    counts = np.bincount(point_idx, minlength=n)
+
+    # النقاط بدون زون تُضاف كزوج بزون -1 في مكانها (الأزواج مرتبة حسب النقطة)
+    missing = np.flatnonzero(counts == 0)
+    rows = np.concatenate([point_idx, missing])
+    zones = np.concatenate([zone_idx, np.full(len(missing), -1, dtype=zone_idx.dtype)])
+    order = np.argsort(rows, kind="stable")
+    rows, zones = rows[order], zones[order]
+    has_zone = zones >= 0
+
+    # ترتيب الزون داخل النقطة (1 = المختار حسب policy، 0 بدون زون)
+    starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)])) + 1
+
+    exploded = out_df.iloc[rows].reset_index(drop=True)
+    matched = np.stack([rows[has_zone], zones[has_zone]])
+    same_square, same_sign = _pair_matches(
+        out_df["square_number"], out_df["sign_number"], matched, df
+    )
+
+    polygon_id = np.zeros(len(rows), dtype=np.int64)
+    polygon_id[has_zone] = df["polygon_id"].to_numpy(dtype=np.int64)[matched[1]]
+    result = np.full(len(rows), "[]", dtype=object)
+    result[has_zone] = "[" + _zone_json_fragments(df)[matched[1]] + "]"
+    cmp_sign = np.full(len(rows), "", dtype=object)
+    cmp_square = np.full(len(rows), "", dtype=object)
+    cmp_result = np.full(len(rows), 4, dtype=np.int64)
+    cmp_sign[has_zone] = np.where(same_sign, "T", "F")
+    cmp_square[has_zone] = np.where(same_square, "T", "F")
+    cmp_result[has_zone] = _cmp_result(same_square, same_sign)
+
+    exploded["polygons_count"] = counts[rows]
+    exploded["zone_rank"] = np.where(has_zone, rank, 0)
+    # Int64: خلية فارغة للنقاط بدون زون والعامود يبقى رقماً صحيحاً
+    exploded["zone_polygon_id"] = pd.arrays.IntegerArray(polygon_id, ~has_zone)
+    exploded["result"] = result
+    exploded["CMP_square"] = cmp_square
+    exploded["CMP_sign"] = cmp_sign
+    exploded["CMP_Result"] = cmp_result
+    return exploded
+
+
+def _zone_json_fragments(df):
+    """نص JSON لكل زون مرة واحدة فقط (polygon_id, square_number, sign_number)"""
+    return np.array([
+        json.dumps({
+            "polygon_id": int(pid),
+            "square_number": sq,
+            "sign_number": sg
+        }, ensure_ascii=False)
+        for pid, sq, sg in zip(
+            df["polygon_id"].tolist(),
+            df["square_number"].tolist(),
+            df["sign_number"].tolist()
+        )
+    ], dtype=object)
+
+
+def zone_matches_json(pairs, df, n):
+    """بناء عامود result (قائمة الزونات لكل نقطة كـ JSON) من ناتج find_points_bulk"""
+    point_idx, zone_idx = pairs
+    result = np.full(n, "[]", dtype=object)
+    if len(point_idx) == 0:
+        return result
+
+    if np.any(np.diff(point_idx) < 0):
+        # find_points_bulk و order_zone_pairs يرتبان حسب النقطة، وهذا لأي مستدعٍ آخر
+        order = np.argsort(point_idx, kind="stable")
+        point_idx, zone_idx = point_idx[order], zone_idx[order]
+
+    fragments = _zone_json_fragments(df)[zone_idx]
+    points, starts, counts = np.unique(point_idx, return_index=True, return_counts=True)
+
+    # زون واحد (الغالب): بدون دمج
+    single = counts == 1
+    result[points[single]] = "[" + fragments[starts[single]] + "]"
+
+    # أكثر من زون: دمج كل مجموعة بعمليات Arrow حسب offsets
+    multi = ~single
+    if multi.any():
+        items = pa.array(fragments[np.repeat(multi, counts)], pa.string())
+        bounds = np.concatenate(([0], np.cumsum(counts[multi])))
+        result[points[multi]] = _json_lists(items, bounds).to_numpy(zero_copy_only=False)
+    return result
+
+
+# عدد النقاط في كل استدعاء للفهرس (نقطة لتحديث التقدم والإلغاء)
+POINT_TEST_CHUNK = 100_000
+
+
+def find_edge_zones(lons, lats, df, spatial_index, tolerance_m):
+    """أقرب زون تبعد حدوده tolerance_m متر أو أقل عن كل نقطة (للنقاط خارج الزونات)
+
+    البحث بـ dwithin في الفهرس بنصف قطر بالدرجات لكل نقطة حسب خط العرض، ثم
+    المسافة الدقيقة إلى حدود كل مرشح بـ Haversine.
+    ترجع (zone_idx, distance_m) بطول عدد النقاط، و zone_idx = -1 إذا لم يوجد زون قريب.
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    n = len(lons)
+
+    zone_idx = np.full(n, -1, dtype=np.int64)
+    distance = np.full(n, np.nan)
+
+    valid = np.flatnonzero(~(np.isnan(lons) | np.isnan(lats)))
+    if len(valid) == 0 or len(df) == 0 or tolerance_m <= 0:
+        return zone_idx, distance
+
+    points = shapely.points(lons[valid], lats[valid])
+    # المتر إلى درجات: درجة الطول أقصر بعامل cos(lat)، فنصف القطر بدرجات الطول
+    # يشمل كل زون داخل tolerance_m في أي اتجاه
+    cos_lat = np.maximum(np.cos(np.radians(lats[valid])), 1e-6)
+    radius = tolerance_m / (np.radians(1.0) * EARTH_RADIUS_M) / cos_lat * 1.01
+    cand_p, cand_t = spatial_index.query(points, predicate="dwithin", distance=radius)
+    if len(cand_p) == 0:
+        return zone_idx, distance
+
+    polygons = df["polygon"].to_numpy()[cand_t]
+    edge_xy = shapely.get_coordinates(
+        shapely.get_point(shapely.shortest_line(points[cand_p], polygons), 1)
+    )
+    cand_d = haversine_m(
+        lons[valid][cand_p], lats[valid][cand_p], edge_xy[:, 0], edge_xy[:, 1]
+    )
+
+    keep = np.flatnonzero(cand_d <= tolerance_m)
+    cand_p, cand_t, cand_d = cand_p[keep], cand_t[keep], cand_d[keep]
+    order = np.lexsort((cand_t, cand_d, cand_p))
+    found, first = np.unique(cand_p[order], return_index=True)
+    best = order[first]
+
+    zone_idx[valid[found]] = cand_t[best]
+    distance[valid[found]] = cand_d[best]
+    return zone_idx, distance
+
+
+def _apply_edge_tolerance(out_df, df, spatial_index, tolerance_m):
+    """النقاط خارج الزونات (4) القريبة من حدود زون ← CMP_Result = 5
+
+    المقارنة (CMP_sign / CMP_square) مع الزون القريب، والمسافة إلى حدوده في
+    edge_distance_m وبياناته في edge_zone.
+    """
+    outside = np.flatnonzero(out_df["CMP_Result"].to_numpy() == 4)
+    zone_idx, distance = find_edge_zones(
+        out_df["lon"].to_numpy()[outside],
+        out_df["lat"].to_numpy()[outside],
+        df,
+        spatial_index,
+        tolerance_m
+    )
+    found = zone_idx >= 0
+    rows = outside[found]
+    zones = zone_idx[found]
+
+    edge_distance = np.full(len(out_df), np.nan)
+    edge_zone = np.full(len(out_df), "", dtype=object)
+    if len(rows):
+        same_square, same_sign = _pair_matches(
+            out_df["square_number"], out_df["sign_number"], np.stack([rows, zones]), df
+        )
+        cmp_sign = out_df["CMP_sign"].to_numpy(dtype=object).copy()
+        cmp_square = out_df["CMP_square"].to_numpy(dtype=object).copy()
+        cmp_result = out_df["CMP_Result"].to_numpy().copy()
+        cmp_sign[rows] = np.where(same_sign, "T", "F")
+        cmp_square[rows] = np.where(same_square, "T", "F")
+        cmp_result[rows] = 5
+        out_df["CMP_sign"] = cmp_sign
+        out_df["CMP_square"] = cmp_square
+        out_df["CMP_Result"] = cmp_result
+
+        edge_distance[rows] = np.round(distance[found], 2)
+        edge_zone[rows] = _zone_json_fragments(df)[zones]
+
+    out_df["edge_distance_m"] = edge_distance
+    out_df["edge_zone"] = edge_zone
+    return out_df
+
+
+def run_points_test(points_df, df, spatial_index, monitor=None, policy="first",
+                    priority_column=DEFAULT_PRIORITY_COLUMN, explode=False, tolerance_m=0.0):
+    """اختبار جدول نقاط كامل ضد الزونات مع الحفاظ على جميع البيانات الأصلية
+
+    monitor (JobMonitor اختياري): التقدم بعدد النقاط وإمكانية الإلغاء بين الدفعات.
+    policy: اختيار الزون الذي تُقارن معه النقطة إذا وقعت في أكثر من زون
+    (ZONE_POLICIES)، ويكون أول زون في عامود result.
+    explode: صف لكل (نقطة، زون) بمقارنة منفصلة، مع zone_rank (1 = المختار
+    حسب policy) و zone_polygon_id.
+    tolerance_m: النقاط خارج كل الزونات وعلى بعد هذه المسافة (متر) أو أقل من حدود
+    زون تأخذ CMP_Result = 5 مع edge_distance_m و edge_zone (0 = بدون).
+    """
+    out_df = points_df.reset_index(drop=True).copy()
+
+    # التأكد من وجود العواميد المطلوبة
+    if "square_number" not in out_df.columns:
+        out_df["square_number"] = ""
+    if "sign_number" not in out_df.columns:
+        out_df["sign_number"] = ""
+
+    n = len(out_df)
+    lons = out_df["lon"].to_numpy()
+    lats = out_df["lat"].to_numpy()
+    parts = [np.empty((2, 0), dtype=np.int64)]
+    for start in range(0, n, POINT_TEST_CHUNK):
+        stop = min(start + POINT_TEST_CHUNK, n)
+        part = find_points_bulk(lons[start:stop], lats[start:stop], df, spatial_index)
+        part[0] += start
+        parts.append(part)
+        if monitor is not None:
+            monitor.update(stop, n)
+    # كل دفعة مرتبة وأرقام نقاطها بعد الدفعة السابقة، فالدمج يبقى مرتباً
+    pairs = np.concatenate(parts, axis=1).astype(np.int64, copy=False)
+    pairs = order_zone_pairs(
+        pairs, df, out_df["square_number"], out_df["sign_number"], policy, priority_column
+    )
+    if explode:
+        out_df = _explode_zone_rows(out_df, pairs, df)
+    else:
+        cmp_sign, cmp_square, cmp_result = compare_zone_data_bulk(
+            out_df["square_number"],
+            out_df["sign_number"],
+            pairs,
+            df
+        )
+
+        out_df["polygons_count"] = np.bincount(pairs[0], minlength=n)
+        out_df["result"] = zone_matches_json(pairs, df, n)
+        out_df["CMP_square"] = cmp_square
+        out_df["CMP_sign"] = cmp_sign
+        out_df["CMP_Result"] = cmp_result
+
+    if tolerance_m > 0:
+        out_df = _apply_edge_tolerance(out_df, df, spatial_index, tolerance_m)
+    return out_df
+
+
+NEAREST_MODES = ("center", "boundary")
+
+
+def find_nearest_zones_bulk(lons, lats, df, spatial_index, mode="center", monitor=None):
+    """إيجاد أقرب زون لمجموعة نقاط باستخدام الفهرس المكاني
+
+    mode="center": المسافة إلى نقطة منتصف الزون (Center)
+    mode="boundary": المسافة إلى حدود الزون (صفر إذا كانت النقطة داخله)
+
+    ترجع (zone_idx, distance_m) بطول عدد النقاط، و zone_idx = -1 إذا لم يوجد زون.
+    monitor (JobMonitor اختياري): التقدم بعدد النقاط كل POINT_TEST_CHUNK نقطة.
+    """
+    if mode not in NEAREST_MODES:
+        raise ValueError(f"طريقة غير معروفة لحساب المسافة: {mode}")
+
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    n = len(lons)
+
+    zone_idx = np.full(n, -1, dtype=np.int64)
+    distance = np.full(n, np.nan)
+
+    valid = np.flatnonzero(~(np.isnan(lons) | np.isnan(lats)))
+    if len(valid) == 0 or len(df) == 0:
+        return zone_idx, distance
+
+    if mode == "center":
+        # في هذا الوضع targets هي إحداثيات المنتصفات (n, 2)
+        targets = np.array(df["Center"].tolist(), dtype=float)
+        tree = STRtree(shapely.points(targets))
+    else:
+        targets = np.asarray(df["polygon"].tolist(), dtype=object)
+        tree = spatial_index
+
+    # الشجرة تُبنى مرة واحدة والنقاط تُعالج على دفعات
+    for start in range(0, len(valid), POINT_TEST_CHUNK):
+        chunk = valid[start:start + POINT_TEST_CHUNK]
+        best_t, best_d, found = _nearest_chunk(lons[chunk], lats[chunk], tree, targets, mode)
+        zone_idx[chunk[found]] = best_t
+        distance[chunk[found]] = best_d
+        if monitor is not None:
+            monitor.update(start + len(chunk), len(valid))
+    return zone_idx, distance
+
+
+def _nearest_chunk(lons, lats, tree, targets, mode):
+    """أقرب زون لدفعة نقاط صالحة: (zone_idx, distance_m, موقع النقاط التي وُجد لها زون)"""
+    points = shapely.points(lons, lats)
+
+    # المرحلة 1: أقرب زون بالدرجات لتحديد نصف قطر البحث لكل نقطة
+    (near_p, _), near_d = tree.query_nearest(points, return_distance=True)
+    radius = np.full(len(points), np.inf)
+    np.minimum.at(radius, near_p, near_d)
+
+    # درجة الطول أقصر من درجة العرض بعامل cos(lat)، فأي زون أقرب بالمتر
+    # يقع داخل هذا النصف قطر بالدرجات
+    cos_lat = np.maximum(np.cos(np.radians(lats)), 1e-6)
+    radius = radius / cos_lat * 1.01 + 1e-9
+
+    # المرحلة 2: كل المرشحين داخل نصف القطر ثم إعادة الترتيب بـ Haversine
+    cand_p, cand_t = tree.query(points, predicate="dwithin", distance=radius)
+
+    if mode == "center":
+        target_xy = targets[cand_t]
+    else:
+        nearest_pts = shapely.get_point(
+            shapely.shortest_line(points[cand_p], targets[cand_t]), 1
+        )
+        target_xy = shapely.get_coordinates(nearest_pts)
+
+    cand_d = haversine_m(
+        lons[cand_p], lats[cand_p],
+        target_xy[:, 0], target_xy[:, 1]
+    )
+
+    order = np.lexsort((cand_t, cand_d, cand_p))
+    found, first = np.unique(cand_p[order], return_index=True)
+    best = order[first]
+    return cand_t[best], cand_d[best], found
+
+
+def find_nearest_zone(point, df, spatial_index=None, mode="center"):
+    """إيجاد أقرب زون لنقطة واحدة (نقطة المنتصف أو حدود الزون)"""
+    if spatial_index is None:
+        spatial_index = STRtree(df["polygon"].tolist())
+
+    zone_idx, distance = find_nearest_zones_bulk(
+        [point.x], [point.y], df, spatial_index, mode
+    )
+    if zone_idx[0] < 0:
+        return None
+
+    row = df.iloc[zone_idx[0]]
+    return {
+        "distance_meters": round(float(distance[0]), 2),
+        "polygon_id": int(row["polygon_id"]),
+        "square_number": row["square_number"],
+        "sign_number": row["sign_number"]
+    }
+
+
+def add_nearest_zone_columns(results_df, df, spatial_index, mode="center", monitor=None):
+    """إضافة أقرب زون للنقاط ذات CMP_Result = 3 أو 4"""
+    final_df = results_df.reset_index(drop=True).copy()
+    target = np.flatnonzero(final_df["CMP_Result"].isin([3, 4]).to_numpy())
+
+    zone_idx, distance = find_nearest_zones_bulk(
+        final_df["lon"].to_numpy()[target],
+        final_df["lat"].to_numpy()[target],
+        df,
+        spatial_index,
+        mode,
+        monitor
+    )
+    found = zone_idx >= 0
+    rows = target[found]
+
+    # NaN (خلية فارغة في Excel / CSV) للنقاط بدون أقرب زون، والعامود يبقى رقمياً
+    nearest_distance = np.full(len(final_df), np.nan)
+    nearest_zone = np.full(len(final_df), "", dtype=object)
+
+    if len(rows):
+        rounded = pd.Series(np.round(distance[found], 2))
+        fragments = pd.Series(_zone_json_fragments(df)[zone_idx[found]])
+        nearest_distance[rows] = rounded.to_numpy()
+        nearest_zone[rows] = (
+            '{"distance_meters": ' + rounded.astype(str) + ", " + fragments.str[1:]
+        ).to_numpy()
+
+    # نضع nearest_distance_m قبل nearest_zone في نهاية الجدول
+    final_df = final_df.drop(columns=["nearest_distance_m", "nearest_zone"], errors="ignore")
+    final_df["nearest_distance_m"] = nearest_distance
+    final_df["nearest_zone"] = nearest_zone
+    return final_df
@@ -0,0 +1,300 @@
+# ======================================================
+# فحص جودة طبقة الزونات (تداخل، فجوات، بوليقونات غير صالحة، تكرار)
+# ======================================================
+import numpy as np
+import pandas as pd
+import shapely
+
+from .geo import polygons_area_sqm, polygons_center
+from .index import ZoneIndex
+from .export import _kml_style_xml, _polygons_kml, _xml_text, write_kml_chunks
+
+
+# أقل مساحة (متر مربع) تُعتبر تداخلاً أو فجوة، لتجاهل فروقات التقريب بين الحدود
+DEFAULT_MIN_AREA_SQM = 1.0
+
+# ألوان KML لكل نوع مشكلة (aabbggrr)
+QA_KML_STYLES = {
+    "overlap": ("880000FF", "FF0000FF"),
+    "invalid": ("8800A5FF", "FF00A5FF"),
+    "gap": ("88FF8800", "FFFF8800")
+}
+
+
+def _valid_polygons(polygons):
+    """نسخة صالحة من كل بوليقون (make_valid للبوليقونات غير الصالحة فقط)"""
+    polygons = np.asarray(polygons, dtype=object)
+    fixed = polygons.copy()
+    invalid = ~shapely.is_valid(polygons)
+    if invalid.any():
+        fixed[invalid] = _polygonal(shapely.make_valid(polygons[invalid]))
+    return fixed
+
+
+def _polygonal(geoms):
+    """الأجزاء المساحية فقط من نتيجة make_valid / intersection (بدون خطوط ونقاط)"""
+    geoms = np.asarray(geoms, dtype=object)
+    out = geoms.copy()
+    mixed = np.flatnonzero(shapely.get_type_id(geoms) == 7)  # GeometryCollection
+    for i in mixed.tolist():
+        parts = [g for g in geoms[i].geoms if g.geom_type in ("Polygon", "MultiPolygon")]
+        out[i] = shapely.union_all(parts) if parts else shapely.Polygon()
+    return out
+
+
+def _intersecting_pairs(polygons, spatial_index):
+    """أزواج الزونات التي تتقاطع (أو تتلامس) مرة واحدة لكل زوج (a < b)"""
+    a, b = spatial_index.query(polygons, predicate="intersects")
+    keep = a < b
+    return a[keep], b[keep]
+
+
+def find_overlaps(df, spatial_index=None, min_area_sqm=DEFAULT_MIN_AREA_SQM, pairs=None):
+    """كل زوجين من الزونات يتداخلان بمساحة (وليس فقط حدود مشتركة)
+
+    استعلام واحد على الفهرس بـ intersects ثم relate للتأكد أن الداخل يتقاطع،
+    والتقاطع نفسه يُحسب فقط للأزواج المتداخلة فعلاً.
+    pairs: أزواج intersects محسوبة مسبقاً (من zone_qa_report).
+    """
+    polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+    if pairs is None:
+        pairs = _intersecting_pairs(polygons, spatial_index or ZoneIndex(df))
+    a, b = pairs
+
+    # مستطيلات تتلامس فقط (مثل المربعات المتجاورة) لا يمكن أن يتداخل داخلها
+    bounds = shapely.bounds(polygons)
+    inner = (
+        (np.minimum(bounds[a, 2], bounds[b, 2]) > np.maximum(bounds[a, 0], bounds[b, 0]))
+        & (np.minimum(bounds[a, 3], bounds[b, 3]) > np.maximum(bounds[a, 1], bounds[b, 1]))
+    )
+    a, b = a[inner], b[inner]
+
+    fixed = _valid_polygons(polygons)
+    interiors = shapely.relate_pattern(fixed[a], fixed[b], "2********")
+    a, b = a[interiors], b[interiors]
+
+    overlap = _polygonal(shapely.intersection(fixed[a], fixed[b]))
+    area = polygons_area_sqm(overlap)
+    big = area >= min_area_sqm
+    a, b, overlap, area = a[big], b[big], overlap[big], area[big]
+
+    ids = df["polygon_id"].to_numpy()
+    squares = df["square_number"].to_numpy(dtype=object)
+    signs = df["sign_number"].to_numpy(dtype=object)
+    return pd.DataFrame({
+        "polygon_id_a": ids[a],
+        "square_number_a": squares[a],
+        "sign_number_a": signs[a],
+        "polygon_id_b": ids[b],
+        "square_number_b": squares[b],
+        "sign_number_b": signs[b],
+        "overlap_area_sqm": area.round(2),
+        "geometry": pd.Series(overlap, dtype=object)
+    })
+
+
+def find_invalid(df):
+    """البوليقونات غير الصالحة مع السبب والمساحة قبل وبعد make_valid"""
+    polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+    invalid = np.flatnonzero(~shapely.is_valid(polygons))
+    repaired = _polygonal(shapely.make_valid(polygons[invalid]))
+
+    return pd.DataFrame({
+        "polygon_id": df["polygon_id"].to_numpy()[invalid],
+        "square_number": df["square_number"].to_numpy(dtype=object)[invalid],
+        "sign_number": df["sign_number"].to_numpy(dtype=object)[invalid],
+        "reason": shapely.is_valid_reason(polygons[invalid]),
+        "area_sqm": df["Area"].to_numpy()[invalid].round(2),
+        "repaired_area_sqm": polygons_area_sqm(repaired).round(2),
+        "repaired_parts": shapely.get_num_geometries(repaired),
+        "geometry": pd.Series(repaired, dtype=object)
+    })
+
+
+def find_duplicates(df):
+    """الزونات التي تشترك في نفس رقم المربع ورقم الشاخص"""
+    keys = df[["square_number", "sign_number"]].astype(object).map(str)
+    dup = keys.duplicated(keep=False).to_numpy()
+    out = df.loc[dup, ["polygon_id", "square_number", "sign_number"]].copy()
+    out["count"] = keys[dup].groupby(["square_number", "sign_number"])["square_number"].transform("size")
+    return out.sort_values(["square_number", "sign_number", "polygon_id"], key=lambda c: c.map(str)).reset_index(drop=True)
+
+
+def _components(a, b, n):
+    """رقم المجموعة المتصلة لكل زون من أزواج التقاطع (label propagation)"""
+    labels = np.arange(n)
+    while True:
+        old = labels.copy()
+        np.minimum.at(labels, a, labels[b])
+        np.minimum.at(labels, b, labels[a])
+        labels = labels[labels]
+        if np.array_equal(labels, old):
+            return labels
+
+
+def zones_union(df, spatial_index=None, pairs=None):
+    """اتحاد كل الزونات كأجزاء منفصلة (بوليقونات لا تتقاطع)
+
+    الاتحاد يُحسب لكل مجموعة زونات متصلة على حدة، والزون المنفرد يبقى كما هو،
+    بدل union_all واحد على كل الطبقة (بطيء جداً مع آلاف الأجزاء المنفصلة).
+    """
+    fixed = _valid_polygons(df["polygon"].tolist())
+    if pairs is None:
+        pairs = _intersecting_pairs(fixed, spatial_index or ZoneIndex(df))
+    a, b = pairs
+    labels = _components(a, b, len(fixed))
+
+    order = np.argsort(labels, kind="stable")
+    _, starts, sizes = np.unique(labels[order], return_index=True, return_counts=True)
+    parts = [fixed[order[starts[sizes == 1]]]]
+    for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+        parts.append(np.asarray([shapely.union_all(fixed[order[start:start + size]])], dtype=object))
+    parts = np.concatenate(parts) if parts else np.empty(0, dtype=object)
+    parts = shapely.get_parts(parts[~shapely.is_empty(parts)])
+    return parts[shapely.get_type_id(parts) == 3]
+
+
+def find_gaps(df, extent=None, min_area_sqm=DEFAULT_MIN_AREA_SQM, spatial_index=None, pairs=None):
+    """الفجوات بين الزونات
+
+    extent: منطقة (بوليقون أو (minx, miny, maxx, maxy)) يجب أن تكون مغطاة بالكامل،
+    والفجوة = ما لا يغطيه أي زون داخلها. بدون extent: الفراغات المحاطة بالزونات فقط
+    (الثقوب داخل اتحاد الطبقة).
+    """
+    union = zones_union(df, spatial_index, pairs)
+
+    if extent is not None:
+        if not isinstance(extent, shapely.Geometry):
+            extent = shapely.box(*extent)
+        covered = union[shapely.intersects(union, extent)]
+        gaps = shapely.difference(extent, shapely.multipolygons(covered))
+        parts = shapely.get_parts(_polygonal([gaps])[0])
+        parts = parts[shapely.get_type_id(parts) == 3]
+    else:
+        holes = shapely.get_num_interior_rings(union)
+        owner = np.repeat(np.arange(len(union)), holes)
+        ring_no = np.arange(len(owner)) - np.repeat(np.cumsum(holes) - holes, holes)
+        parts = shapely.polygons(shapely.get_interior_ring(union[owner], ring_no))
+    parts = np.asarray(parts, dtype=object)
+
+    area = polygons_area_sqm(parts) if len(parts) else np.empty(0)
+    big = area >= min_area_sqm
+    parts, area = parts[big], area[big]
+    centers = polygons_center(parts)
+    return pd.DataFrame({
+        "gap_id": np.arange(1, len(parts) + 1),
+        "area_sqm": area.round(2),
+        "center_lon": [c[0] for c in centers],
+        "center_lat": [c[1] for c in centers],
+        "geometry": pd.Series(parts, dtype=object)
+    })
+
+
+def zone_qa_report(df, spatial_index=None, extent=None, min_area_sqm=DEFAULT_MIN_AREA_SQM):
+    """فحص شامل للطبقة: {"summary", "overlaps", "invalid", "duplicates", "gaps"}
+
+    استعلام intersects على الفهرس يُنفذ مرة واحدة ويُستخدم للتداخل والفجوات.
+    """
+    if spatial_index is None:
+        spatial_index = ZoneIndex(df)
+    pairs = _intersecting_pairs(df["polygon"].tolist(), spatial_index)
+
+    overlaps = find_overlaps(df, spatial_index, min_area_sqm, pairs)
+    invalid = find_invalid(df)
+    duplicates = find_duplicates(df)
+    gaps = find_gaps(df, extent, min_area_sqm, spatial_index, pairs)
+
+    summary = pd.DataFrame({
+        "check": ["zones", "overlapping_pairs", "overlap_area_sqm", "invalid_polygons",
+                  "duplicate_square_sign", "gaps", "gap_area_sqm"],
+        "value": pd.Series([len(df), len(overlaps), round(float(overlaps["overlap_area_sqm"].sum()), 2),
+                  len(invalid), len(duplicates), len(gaps), round(float(gaps["area_sqm"].sum()), 2)],
+                           dtype=object)
+    })
+    return {
+        "summary": summary,
+        "overlaps": overlaps,
+        "invalid": invalid,
+        "duplicates": duplicates,
+        "gaps": gaps
+    }
+
+
+def repair_invalid_zones(df, accurate_area=False):
+    """نسخة من الطبقة بعد make_valid للبوليقونات غير الصالحة، مع (df, spatial_index) جديد
+
+    إذا انقسم البوليقون لعدة أجزاء يصبح MultiPolygon (انظر repaired_parts في التقرير).
+    """
+    df = df.copy()
+    polygons = np.asarray(df["polygon"].tolist(), dtype=object)
+    invalid = np.flatnonzero(~shapely.is_valid(polygons))
+    if len(invalid):
+        repaired = _polygonal(shapely.make_valid(polygons[invalid]))
+        polygons[invalid] = repaired
+        df["polygon"] = pd.Series(polygons, index=df.index, dtype=object)
+        df["Area"] = polygons_area_sqm(polygons, accurate_area)
+        df["Center"] = polygons_center(polygons)
+    return df, ZoneIndex(df)
+
+
+# ======================================================
+# تصدير التقرير
+# ======================================================
+def write_qa_excel(report, target):
+    """كتابة التقرير كملف Excel بورقة لكل فحص (بدون عامود geometry)"""
+    with pd.ExcelWriter(target) as writer:
+        for name, table in report.items():
+            table.drop(columns=["geometry"], errors="ignore").to_excel(
+                writer, sheet_name=name, index=False
+            )
+
+
+def _placemarks(table, kind, name_of):
+    table = table[~shapely.is_empty(table["geometry"].to_numpy(dtype=object))]
+    geometries = _polygons_kml(table["geometry"].to_numpy(dtype=object), "        ")
+    for row, geometry in zip(table.drop(columns=["geometry"]).to_dict("records"), geometries):
+        data = "".join(
+            f'        <Data name="{_xml_text(k)}"><value>{_xml_text(v)}</value></Data>\n'
+            for k, v in row.items()
+        )
+        yield (
+            '      <Placemark>\n'
+            f'        <name>{_xml_text(name_of(row))}</name>\n'
+            f'        <styleUrl>#qa-{kind}</styleUrl>\n'
+            '        <ExtendedData>\n'
+            f'{data}'
+            '        </ExtendedData>\n'
+            f'{geometry}'
+            '      </Placemark>\n'
+        )
+
+
+def iter_qa_kml(report):
+    """KML للتقرير: مجلد لكل نوع (مناطق التداخل، البوليقونات بعد الإصلاح، الفجوات)"""
+    yield (
+        '<?xml version="1.0" ?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+        '  <Document>\n'
+    )
+    for kind, (fill, line) in QA_KML_STYLES.items():
+        yield _kml_style_xml(fill, line, "    ", f"qa-{kind}")
+
+    folders = (
+        ("overlap", "overlaps", "التداخل",
+         lambda r: f"{r['polygon_id_a']} × {r['polygon_id_b']}"),
+        ("invalid", "invalid", "بوليقونات غير صالحة (بعد الإصلاح)",
+         lambda r: f"Polygon {r['polygon_id']}"),
+        ("gap", "gaps", "الفجوات",
+         lambda r: f"Gap {r['gap_id']}"),
+    )
+    for kind, key, title, name_of in folders:
+        yield f'    <Folder>\n      <name>{title}</name>\n'
+        yield from _placemarks(report[key], kind, name_of)
+        yield '    </Folder>\n'
+
+    yield '  </Document>\n</kml>\n'
+
+
+def write_qa_kml(report, target, kmz=False):
+    """كتابة KML (أو KMZ) للتقرير"""
+    write_kml_chunks(iter_qa_kml(report), target, kmz)
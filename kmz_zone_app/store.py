@@ -0,0 +1,207 @@
+# ======================================================
+# تعديل طبقة الزونات بدون إعادة بناء كاملة
+# ======================================================
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from .geo import polygons_area_sqm, polygons_center
+from .index import ZoneIndex, OverlayZoneIndex
+from .zones import iter_placemarks, _placemark_geometries, polygon_coordinates, coordinates_polygon
+from .pipeline import read_points_table
+
+
+# "" = إضافة إذا كان polygon_id جديداً وتعديل إذا كان موجوداً
+ZONE_CHANGE_ACTIONS = ("", "add", "modify", "delete")
+ZONE_CHANGE_FILE_TYPES = ("kmz", "kml", "xlsx", "csv", "parquet")
+
+# الدمج (إعادة بناء STRtree) بعد هذا العدد من الزونات المعدّلة أو نسبة من الطبقة
+COMPACT_MIN_CHANGES = 256
+COMPACT_RATIO = 0.05
+
+
+def load_zone_changes(source):
+    """قراءة ملف تعديلات زونات (kmz / kml / xlsx / csv / parquet)
+
+    الجدول: polygon_id, action, square_number, sign_number, coordinates
+    (action اختياري، انظر ZONE_CHANGE_ACTIONS).
+    في KML: polygon_id من ExtendedData أو اسم "Polygon <id>"، والـ Placemark بدون
+    Polygon يعني حذف.
+    """
+    name = source if isinstance(source, (str, os.PathLike)) else source.name
+    ext = os.path.splitext(str(name))[1].lower()
+
+    if ext in (".kmz", ".kml"):
+        rows, placemark_rings = [], []
+        opened = open(source, "rb") if isinstance(source, (str, os.PathLike)) else None
+        try:
+            for square, sign, rings, polygon_id in iter_placemarks(opened or source):
+                if polygon_id is None:
+                    raise ValueError("Placemark بدون polygon_id في ملف التعديلات")
+                rows.append({
+                    "polygon_id": polygon_id,
+                    "action": "" if rings else "delete",
+                    "square_number": square,
+                    "sign_number": sign,
+                    "coordinates": None
+                })
+                if rings:
+                    placemark_rings.append((len(rows) - 1, rings))
+        finally:
+            if opened is not None:
+                opened.close()
+        if placemark_rings:
+            geoms = _placemark_geometries([rings for _, rings in placemark_rings])
+            for (row, _), coords in zip(placemark_rings, polygon_coordinates(geoms)):
+                rows[row]["coordinates"] = coords
+        changes = pd.DataFrame(rows, columns=[
+            "polygon_id", "action", "square_number", "sign_number", "coordinates"
+        ])
+    else:
+        changes = read_points_table(source)
+        if "polygon_id" not in changes.columns:
+            raise ValueError("العامود polygon_id مفقود في ملف التعديلات")
+        if "action" not in changes.columns:
+            changes["action"] = ""
+        for col in ("square_number", "sign_number", "coordinates"):
+            if col not in changes.columns:
+                changes[col] = None
+        changes["coordinates"] = changes["coordinates"].apply(
+            lambda c: json.loads(c) if isinstance(c, str) else None
+        )
+
+    changes["action"] = changes["action"].fillna("").astype(str).str.strip().str.lower()
+    unknown = sorted(set(changes["action"]) - set(ZONE_CHANGE_ACTIONS))
+    if unknown:
+        raise ValueError(f"قيم غير معروفة في عامود action: {unknown}")
+    try:
+        changes["polygon_id"] = changes["polygon_id"].astype(np.int64)
+    except (TypeError, ValueError):
+        raise ValueError("polygon_id في ملف التعديلات يجب أن يكون رقماً صحيحاً")
+    return changes[["polygon_id", "action", "square_number", "sign_number", "coordinates"]]
+
+
+class ZoneStore:
+    """طبقة زونات قابلة للتعديل (إضافة / تعديل / حذف حسب polygon_id)
+
+    الطبقة الأساسية وفهرسها لا يتغيران (يمكن مشاركتهما من الذاكرة المؤقتة):
+    الحذف يُعلّم الصف فقط، والزونات الجديدة أو المعدّلة في جدول صغير بفهرس خاص،
+    ويُدمج الكل في فهرس واحد عند تجاوز حد التعديلات.
+    """
+
+    def __init__(self, df, spatial_index=None, accurate_area=False,
+                 compact_min=COMPACT_MIN_CHANGES, compact_ratio=COMPACT_RATIO):
+        self.accurate_area = accurate_area
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.compactions = 0
+        self._set_base(df.reset_index(drop=True), spatial_index)
+
+    def _set_base(self, df, spatial_index):
+        ids = df["polygon_id"].to_numpy(dtype=np.int64)
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("polygon_id مكرر في طبقة الزونات")
+
+        self._base = df
+        self._base_index = spatial_index if isinstance(spatial_index, ZoneIndex) else ZoneIndex(df)
+        self._alive = np.ones(len(df), dtype=bool)
+        self._base_pos = dict(zip(ids.tolist(), range(len(ids))))
+        self._overlay = df.iloc[:0].copy()
+        self._overlay_index = ZoneIndex(self._overlay)
+        self._layer = (df, self._base_index)
+
+    @property
+    def pending_changes(self):
+        """عدد الزونات المحذوفة أو الجديدة منذ آخر دمج"""
+        return int((~self._alive).sum()) + len(self._overlay)
+
+    def __contains__(self, polygon_id):
+        polygon_id = int(polygon_id)
+        if polygon_id in self._base_pos and self._alive[self._base_pos[polygon_id]]:
+            return True
+        return bool((self._overlay["polygon_id"] == polygon_id).any())
+
+    def _new_rows(self, changes):
+        """صفوف الزونات الجديدة مع Area و Center لها فقط"""
+        polygons = [coordinates_polygon(c) for c in changes["coordinates"]]
+        rows = pd.DataFrame({
+            "polygon_id": changes["polygon_id"].to_numpy(dtype=np.int64),
+            "square_number": pd.Series(changes["square_number"].tolist(), dtype=object),
+            "sign_number": pd.Series(changes["sign_number"].tolist(), dtype=object),
+            "polygon": pd.Series(polygons, dtype=object)
+        })
+        rows["Area"] = polygons_area_sqm(rows["polygon"], self.accurate_area)
+        rows["Center"] = polygons_center(rows["polygon"])
+        return rows[[c for c in self._base.columns if c in rows.columns]]
+
+    def apply(self, changes):
+        """تطبيق جدول تعديلات (من load_zone_changes) دفعة واحدة
+
+        كل التعديلات تُفحص أولاً: polygon_id غير موجود للتعديل/الحذف أو موجود
+        للإضافة يرفع ValueError بدون تغيير الطبقة. ترجع عدد (إضافة، تعديل، حذف).
+        """
+        ids = changes["polygon_id"].to_numpy(dtype=np.int64)
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("polygon_id مكرر في ملف التعديلات")
+
+        exists = np.array([i in self for i in ids.tolist()], dtype=bool)
+        action = changes["action"].to_numpy(dtype=object)
+        action = np.where(action == "", np.where(exists, "modify", "add"), action)
+
+        missing = ids[(action != "add") & ~exists]
+        if len(missing):
+            raise ValueError(f"زونات غير موجودة للتعديل أو الحذف: {missing.tolist()[:20]}")
+        duplicate = ids[(action == "add") & exists]
+        if len(duplicate):
+            raise ValueError(f"زونات موجودة مسبقاً ولا يمكن إضافتها: {duplicate.tolist()[:20]}")
+        upsert = action != "delete"
+        if changes["coordinates"][upsert].isna().any():
+            raise ValueError("الإحداثيات مطلوبة لكل زون مضاف أو معدّل")
+
+        # إزالة النسخ القديمة (من الأساسي بالتعليم، ومن الجدول الصغير بالحذف)
+        removed = ids[action != "add"]
+        # نسخة جديدة حتى لا تتغير طبقة سابقة رجعت من layer()
+        self._alive = self._alive.copy()
+        for polygon_id in removed.tolist():
+            pos = self._base_pos.get(polygon_id)
+            if pos is not None:
+                self._alive[pos] = False
+        overlay = self._overlay[~self._overlay["polygon_id"].isin(removed)]
+
+        self._overlay = pd.concat(
+            [overlay, self._new_rows(changes[upsert])], ignore_index=True
+        ) if upsert.any() else overlay.reset_index(drop=True)
+        self._overlay_index = ZoneIndex(self._overlay)
+        self._layer = None
+
+        if self.pending_changes > max(self.compact_min, self.compact_ratio * len(self._base)):
+            self.compact()
+
+        return {
+            "added": int((action == "add").sum()),
+            "modified": int((action == "modify").sum()),
+            "deleted": int((action == "delete").sum())
+        }
+
+    def layer(self):
+        """(df, spatial_index) للطبقة الحالية، بنفس الشكل الذي ترجعه دوال التحميل"""
+        if self._layer is None:
+            keep = np.flatnonzero(self._alive)
+            df = pd.concat([self._base.iloc[keep], self._overlay], ignore_index=True)
+            df.attrs = dict(self._base.attrs)
+            self._layer = (df, OverlayZoneIndex(self._base_index, self._alive, self._overlay_index))
+        return self._layer
+
+    def compact(self):
+        """دمج التعديلات في طبقة أساسية جديدة وبناء STRtree واحد لها"""
+        if not self.pending_changes:
+            return
+        df, overlay_index = self.layer()
+        # المستطيلات الداخلية المحسوبة وإعدادات الجدول الشبكي تنتقل بدون إعادة حساب
+        spatial_index = ZoneIndex(df, *overlay_index.interior_state)
+        if self._base_index.grid_config is not None:
+            spatial_index.enable_grid(*self._base_index.grid_config)
+        self._set_base(df, spatial_index)
+        self.compactions += 1
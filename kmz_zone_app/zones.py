@@ -0,0 +1,595 @@
+# ======================================================
+# قراءة وتحميل طبقات الزونات
+# ======================================================
+import os
+import re
+import html
+import zipfile
+import json
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from html.entities import html5 as html5_entities
+from datetime import datetime, timezone
+import pandas as pd
+import numpy as np
+import shapely
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from shapely.geometry import Polygon, MultiPolygon
+from bs4 import BeautifulSoup
+import xml.etree.ElementTree as ET
+
+from .geo import polygons_area_sqm, polygons_center
+from .index import ZoneIndex
+
+
+KML_NS = {"kml": "http://www.opengis.net/kml/2.2"}
+_PLACEMARK_TAG = "{http://www.opengis.net/kml/2.2}Placemark"
+
+
+_TD_RE = re.compile(r"<td\b[^>]*>(.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+_TD_OPEN_RE = re.compile(r"<td\b", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[A-Za-z/][^>]*>")
+# أي من هذه يعني HTML لا يصلح له المسار السريع: < ليس بداية وسم عادي
+# (نص "x < y" أو <!-- / <! / <? / </ بدون اسم)، وسم بدون > قبل < التالي،
+# script / style، أو خلايا متداخلة
+_HTML_FALLBACK_RE = re.compile(
+    r"<(?![A-Za-z]|/[A-Za-z])|<[A-Za-z/][^<>]*(?:<|$)|<script|<style|<td\b[^>]*>[^<]*<td\b",
+    re.IGNORECASE
+)
+# سمة بين علامتي تنصيص فيها < أو > (يقطع _TAG_RE الوسم عندها)
+_QUOTED_ANGLE_RE = re.compile(r"""<[A-Za-z][^<>"']*(?:"[^"]*[<>]|'[^']*[<>])""")
+# نفس حدود اسم الكيان في html.parser (يشمل - و .)
+_ENTITY_RE = re.compile(r"&(#[xX][0-9A-Fa-f]+|#[0-9]+|#|[A-Za-z][-.A-Za-z0-9]*)(;?)")
+
+
+def _entity_differs(desc):
+    """كيان يفكّه html.unescape بغير طريقة BeautifulSoup
+
+    بدون ; (مثل &nbspy)، اسم غير معروف (&unknown;)، &# بدون رقم،
+    أو رقم لحرف تحكم / غير صالح (&#1;).
+    """
+    for name, semicolon in _ENTITY_RE.findall(desc):
+        if name == "#" or not semicolon:
+            return True
+        if name[0] != "#":
+            if name + ";" not in html5_entities:
+                return True
+            continue
+        code = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+        if code > 0x10FFFF or 0xD800 <= code <= 0xDFFF or 0x7F <= code <= 0x9F \
+                or (code < 0x20 and code not in (0x09, 0x0A, 0x0D)):
+            return True
+    return False
+
+
+def _fast_td_texts(desc):
+    """استخراج نصوص خلايا <td> بـ regex، أو None إذا كان HTML غير بسيط"""
+    if _HTML_FALLBACK_RE.search(desc) or _QUOTED_ANGLE_RE.search(desc) or _entity_differs(desc):
+        return None
+
+    cells = _TD_RE.findall(desc)
+    if len(cells) != len(_TD_OPEN_RE.findall(desc)):
+        return None  # خلايا غير مغلقة أو متداخلة
+
+    # نفس نتيجة get_text(strip=True): كل جزء نصي بدون مسافات ثم دمج
+    return [
+        "".join(html.unescape(part).strip() for part in _TAG_RE.split(cell))
+        for cell in cells
+    ]
+
+
+_POLYGON_NAME_RE = re.compile(r"^\s*Polygon\s+(\S+)\s*$")
+
+
+def _placemark_fields(placemark, stats=None):
+    """استخراج (رقم المربع، رقم الشاخص، البوليقونات، polygon_id) من Placemark
+
+    البوليقونات: لكل <Polygon> (داخل MultiGeometry أيضاً) قائمة نصوص <coordinates>
+    للحلقات، الخارجية أولاً ثم الثقوب (innerBoundaryIs).
+    polygon_id من ExtendedData أو من الاسم "Polygon <id>" (كما يكتبه التصدير)، أو None.
+    """
+    ns = KML_NS
+    desc = placemark.findtext("kml:description", "", ns)
+
+    square, sign = "", ""
+    name_match = _POLYGON_NAME_RE.match(placemark.findtext("kml:name", "", ns))
+    polygon_id = name_match.group(1) if name_match else None
+
+    # ===== استخراج من Description (الطريقة القديمة) =====
+    if desc:
+        tds = _fast_td_texts(desc)
+        if stats is not None:
+            stats["descriptions"] += 1
+        if tds is None:
+            # المسار البطيء: BeautifulSoup فقط عند فشل المسار السريع
+            soup = BeautifulSoup(desc, "html.parser")
+            tds = [td.get_text(strip=True) for td in soup.find_all("td")]
+            if stats is not None:
+                stats["soup_fallbacks"] += 1
+        for i in range(len(tds)):
+            if tds[i] == "رقم المربع":
+                square = tds[i + 1]
+            if tds[i] == "رقم الشاخص":
+                sign = tds[i + 1]
+
+    # ===== استخراج من ExtendedData (الطريقة الجديدة) =====
+    extended_data = placemark.find("kml:ExtendedData", ns)
+    if extended_data is not None:
+        for data in extended_data.findall("kml:Data", ns):
+            name = data.get("name")
+            value = data.findtext("kml:value", "", ns)
+            if name == "square_number":
+                square = value
+            elif name == "sign_number":
+                sign = value
+            elif name == "polygon_id":
+                polygon_id = value
+
+    rings = []
+    for poly in placemark.findall(".//kml:Polygon", ns):
+        outer = poly.find("kml:outerBoundaryIs", ns)
+        outer_text = (outer if outer is not None else poly).findtext(".//kml:coordinates", "", ns).strip()
+        if not outer_text:
+            continue
+        inner_texts = [
+            ring.text.strip()
+            for ring in poly.findall("kml:innerBoundaryIs//kml:coordinates", ns)
+            if ring.text and ring.text.strip()
+        ]
+        rings.append([outer_text] + inner_texts)
+    return square, sign, rings, polygon_id
+
+
+def _iter_placemark_stream(stream, stats=None):
+    """قراءة Placemarks من stream باستخدام iterparse وحذف كل عنصر بعد معالجته"""
+    parents = []
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag == _PLACEMARK_TAG:
+            yield _placemark_fields(elem, stats)
+            # حذف الـ Placemark من الشجرة حتى لا تكبر الذاكرة مع حجم الملف
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+
+def iter_placemarks(uploaded_file, stats=None):
+    """قراءة Placemarks من KMZ أو KML واحداً تلو الآخر بدون تحميل الملف كاملاً"""
+    if uploaded_file.name.lower().endswith(".kmz"):
+        with zipfile.ZipFile(uploaded_file, "r") as kmz:
+            kml_name = [f for f in kmz.namelist() if f.endswith(".kml")][0]
+            with kmz.open(kml_name) as stream:
+                yield from _iter_placemark_stream(stream, stats)
+    else:
+        yield from _iter_placemark_stream(uploaded_file, stats)
+
+
+def _slow_rings_xy(ring_texts):
+    """قراءة كل رأس على حدة (نصوص بأبعاد مختلطة أو غير صالحة للمسار السريع)"""
+    coords = []
+    for text in ring_texts:
+        for c in text.split():
+            lon, lat, *_ = c.split(",")
+            coords.append((float(lon), float(lat)))
+    return np.array(coords, dtype=float).reshape(-1, 2)
+
+
+def _rings_xy(ring_texts):
+    """(lon, lat) لكل رؤوس مجموعة نصوص <coordinates> دفعة واحدة، وعدد الرؤوس لكل حلقة
+
+    كل النصوص تُقرأ بـ np.fromstring واحد بدل split لكل رأس؛ الرأس قد يكون
+    lon,lat أو lon,lat,alt (ويمكن اختلافهما بين الحلقات).
+    """
+    counts = np.array([len(t.split()) for t in ring_texts], dtype=np.int64)
+    commas = np.array([t.count(",") for t in ring_texts], dtype=np.int64)
+    dims = np.where(counts > 0, commas // np.maximum(counts, 1) + 1, 2)
+
+    if len(ring_texts) and ((commas != counts * (dims - 1)) | (dims < 2) | (dims > 3)).any():
+        return _slow_rings_xy(ring_texts), counts
+
+    values = np.fromstring(" ".join(ring_texts).replace(",", " "), sep=" ")
+    if len(values) != int((counts * dims).sum()):
+        return _slow_rings_xy(ring_texts), counts
+
+    vertex_dims = np.repeat(dims, counts)
+    starts = np.cumsum(vertex_dims) - vertex_dims
+    return np.column_stack([values[starts], values[starts + 1]]), counts
+
+
+def parse_coordinates_text(coords_text):
+    """نص <coordinates> إلى قائمة (lon, lat)"""
+    xy, _ = _rings_xy([coords_text])
+    return [tuple(c) for c in xy.tolist()]
+
+
+def _placemark_geometries(placemark_rings):
+    """Polygon (مع الثقوب) أو MultiPolygon لكل Placemark دفعة واحدة
+
+    placemark_rings: لكل Placemark قائمة بوليقونات كما ترجعها _placemark_fields.
+    """
+    polygon_rings = [poly for polys in placemark_rings for poly in polys]
+    ring_texts = [text for poly in polygon_rings for text in poly]
+    polygon_owner = np.repeat(np.arange(len(placemark_rings)), [len(p) for p in placemark_rings])
+    ring_owner = np.repeat(np.arange(len(polygon_rings)), [len(p) for p in polygon_rings])
+
+    xy, counts = _rings_xy(ring_texts)
+    rings = shapely.linearrings(xy, indices=np.repeat(np.arange(len(ring_texts)), counts))
+    polygons = shapely.polygons(rings, indices=ring_owner)
+
+    parts = np.bincount(polygon_owner, minlength=len(placemark_rings))
+    geoms = np.empty(len(placemark_rings), dtype=object)
+    single = parts[polygon_owner] == 1
+    geoms[polygon_owner[single]] = polygons[single]
+    if not single.all():
+        multi_owner, multi_idx = np.unique(polygon_owner[~single], return_inverse=True)
+        geoms[multi_owner] = shapely.multipolygons(polygons[~single], indices=multi_idx)
+    return geoms
+
+
+def _coordinate_offsets(polygons):
+    """مصفوفة إحداثيات مسطحة مع offsets (حلقات، أجزاء، بوليقونات) بشكل GeoArrow
+
+    ترجع (flat, coord_bounds, ring_bounds, part_bounds, multi): الحلقة i رؤوسها
+    flat[coord_bounds[i]:coord_bounds[i + 1]]، والجزء j حلقاته من ring_bounds، وهكذا.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    parts, part_owner = shapely.get_parts(polygons, return_index=True)
+    rings, ring_owner = shapely.get_rings(parts, return_index=True)
+    flat, coord_owner = shapely.get_coordinates(rings, return_index=True)
+    return (
+        flat,
+        np.searchsorted(coord_owner, np.arange(len(rings) + 1)),
+        np.searchsorted(ring_owner, np.arange(len(parts) + 1)),
+        np.searchsorted(part_owner, np.arange(len(polygons) + 1)),
+        shapely.get_type_id(polygons) == 6
+    )
+
+
+def polygon_coordinates(polygons):
+    """coordinates كقوائم من الهندسة
+
+    بوليقون بسيط: [[lon, lat], ...] للحد الخارجي (الشكل الأصلي)،
+    بوليقون بثقوب: [الحد الخارجي، ثقب، ...]، و MultiPolygon: قائمة بوليقونات بالشكل السابق.
+    """
+    flat, coord_bounds, ring_bounds, part_bounds, multi = _coordinate_offsets(polygons)
+    flat = flat.tolist()
+    rings = [flat[a:b] for a, b in zip(coord_bounds[:-1].tolist(), coord_bounds[1:].tolist())]
+    ring_bounds = ring_bounds.tolist()
+
+    coordinates = []
+    for a, b, is_multi in zip(part_bounds[:-1].tolist(), part_bounds[1:].tolist(), multi.tolist()):
+        if is_multi:
+            coordinates.append([rings[ring_bounds[p]:ring_bounds[p + 1]] for p in range(a, b)])
+        elif b - a == 1 and ring_bounds[a + 1] - ring_bounds[a] == 1:
+            coordinates.append(rings[ring_bounds[a]])
+        elif b - a == 1:
+            coordinates.append(rings[ring_bounds[a]:ring_bounds[a + 1]])
+        else:
+            coordinates.append([])
+    return coordinates
+
+
+def _json_numbers(values):
+    """نص JSON لكل رقم (نفس float.__repr__ الذي يستخدمه json.dumps)
+
+    التحويل بـ Arrow دفعة واحدة، و repr فقط للأرقام التي يكتبها Arrow بشكل مختلف
+    (أرقام صحيحة مثل 39.0، وصيغة الأس للأرقام الصغيرة أو الكبيرة جداً).
+    """
+    text = pc.cast(pa.array(values), pa.string())
+    magnitude = np.abs(values)
+    odd = np.flatnonzero((values == np.trunc(values)) | (magnitude < 1e-4) | (magnitude >= 1e16))
+    if len(odd):
+        text = text.to_numpy(zero_copy_only=False)
+        text[odd] = [repr(v) for v in values[odd].tolist()]
+        text = pa.array(text, pa.string())
+    return text
+
+
+def _json_lists(items, bounds):
+    """"[a, b, ...]" لكل مجموعة من items حسب offsets"""
+    lists = pa.ListArray.from_arrays(pa.array(bounds, pa.int64()), items)
+    return pc.binary_join_element_wise("[", pc.binary_join(lists, ", "), "]", "")
+
+
+def coordinates_json(polygons):
+    """coordinates كنص JSON لكل بوليقون (نفس ناتج json.dumps(polygon_coordinates(...)))
+
+    يُبنى من مصفوفة الإحداثيات المسطحة و offsets بعمليات Arrow على كل الطبقة،
+    بدون قوائم Python لكل رأس.
+    """
+    flat, coord_bounds, ring_bounds, part_bounds, multi = _coordinate_offsets(polygons)
+    vertices = pc.binary_join_element_wise(
+        "[", _json_numbers(flat[:, 0]), ", ", _json_numbers(flat[:, 1]), "]", ""
+    )
+    rings = _json_lists(vertices, coord_bounds)
+    parts = _json_lists(rings, ring_bounds)
+    multi_parts = _json_lists(parts, part_bounds).to_numpy(zero_copy_only=False)
+
+    rings = rings.to_numpy(zero_copy_only=False)
+    parts = parts.to_numpy(zero_copy_only=False)
+    n_parts = np.diff(part_bounds)
+    first_part = np.minimum(part_bounds[:-1], len(parts) - 1)
+    n_rings = np.diff(ring_bounds)[first_part] if len(parts) else np.zeros(len(n_parts), dtype=np.int64)
+
+    out = np.full(len(n_parts), "[]", dtype=object)
+    single = ~multi & (n_parts == 1)
+    simple = single & (n_rings == 1)
+    holes = single & (n_rings > 1)
+    out[simple] = rings[ring_bounds[first_part[simple]]]
+    out[holes] = parts[first_part[holes]]
+    out[multi] = multi_parts[multi]
+    return out.tolist()
+
+
+def coordinates_polygon(coords):
+    """عكس polygon_coordinates: Polygon أو MultiPolygon من قائمة الإحداثيات"""
+    if coords is None or not len(coords):
+        return Polygon()
+    if np.ndim(coords[0][0]) == 0:
+        return Polygon(coords)
+    if np.ndim(coords[0][0][0]) == 0:
+        return Polygon(coords[0], coords[1:])
+    return MultiPolygon([(poly[0], poly[1:]) for poly in coords])
+
+
+# عدد الـ Placemarks التي تُقرأ إحداثياتها وتُبنى هندستها معاً
+PARSE_BATCH = 10000
+
+
+def _source_size(source):
+    """حجم الملف بالبايت (None إذا لم يمكن معرفته بدون قراءته)"""
+    if hasattr(source, "size"):
+        return source.size
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer().nbytes
+    try:
+        return os.fstat(source.fileno()).st_size
+    except (AttributeError, OSError):
+        return None
+
+
+def parse_kmz_or_kml(uploaded_file, accurate_area=False, monitor=None):
+    """قراءة KMZ أو KML واستخراج البوليقونز
+
+    صف واحد لكل Placemark: Polygon مع الثقوب، أو MultiPolygon إذا كان فيه
+    أكثر من بوليقون (MultiGeometry).
+    إحصائيات القراءة (مثل عدد الأوصاف التي احتاجت BeautifulSoup) في df.attrs["parse_stats"].
+    monitor (JobMonitor اختياري): التقدم بالبايتات المقروءة من الملف (المضغوط في KMZ)
+    بعد كل PARSE_BATCH زون، مع إمكانية الإلغاء.
+    """
+    squares, signs, polygons = [], [], []
+    batch = []
+    stats = Counter(descriptions=0, soup_fallbacks=0)
+    total_bytes = _source_size(uploaded_file) if monitor is not None else None
+
+    for square, sign, rings, _ in iter_placemarks(uploaded_file, stats):
+        if not rings:
+            continue
+        squares.append(square)
+        signs.append(sign)
+        batch.append(rings)
+        if len(batch) >= PARSE_BATCH:
+            polygons.append(_placemark_geometries(batch))
+            batch = []
+            if monitor is not None:
+                monitor.update(uploaded_file.tell(), total_bytes)
+    if batch or not polygons:
+        polygons.append(_placemark_geometries(batch))
+    polygons = np.concatenate(polygons)
+
+    df = pd.DataFrame({
+        "polygon_id": np.arange(1, len(polygons) + 1),
+        "square_number": pd.Series(squares, dtype=object),
+        "sign_number": pd.Series(signs, dtype=object),
+        "polygon": pd.Series(polygons, dtype=object)
+    })
+
+    # حساب المساحة بالمتر المربع ونقطة المنتصف لكل الزونات دفعة واحدة
+    df["Area"] = polygons_area_sqm(df["polygon"], accurate_area)
+    df["Center"] = polygons_center(df["polygon"])
+    df.attrs["parse_stats"] = dict(stats)
+    spatial_index = ZoneIndex(df)
+    if monitor is not None and total_bytes is not None:
+        monitor.update(total_bytes, total_bytes)
+    return df, spatial_index
+
+
+def load_polygons_from_excel(uploaded_excel, accurate_area=False):
+    """تحميل زونات من Excel"""
+    df = pd.read_excel(uploaded_excel)
+    
+    # التأكد من وجود العواميد الأساسية
+    required_cols = ["polygon_id", "square_number", "sign_number", "coordinates"]
+    for col in required_cols:
+        if col not in df.columns:
+            raise ValueError(f"العامود {col} مفقود في ملف Excel")
+    
+    # coordinates (JSON) إلى هندسة؛ الإحداثيات تُحفظ في الهندسة فقط
+    polygons = [coordinates_polygon(json.loads(c)) for c in df["coordinates"].tolist()]
+    df = df.drop(columns=["coordinates"])
+    df["polygon"] = pd.Series(polygons, index=df.index, dtype=object)
+    
+    # حساب Area إذا كانت فارغة أو غير موجودة
+    if "Area" not in df.columns or df["Area"].isna().any():
+        df["Area"] = polygons_area_sqm(df["polygon"], accurate_area)
+    
+    # حساب Center إذا كانت فارغة أو غير موجودة
+    if "Center" not in df.columns or df["Center"].isna().any():
+        df["Center"] = polygons_center(df["polygon"])
+    else:
+        # تحويل Center من string إلى tuple إذا كانت موجودة
+        df["Center"] = df["Center"].apply(lambda c: json.loads(c) if isinstance(c, str) else c)
+    
+    spatial_index = ZoneIndex(df)
+    return df, spatial_index
+
+
+def zones_export_frame(df):
+    """جدول الزونات للتصدير (Excel / CSV) مع coordinates و Center كنص JSON
+
+    coordinates تُولّد من الهندسة هنا فقط (العمود لا يُحفظ في الطبقة).
+    """
+    export_df = df.drop(columns=["polygon"]).copy()
+    export_df.insert(
+        min(3, len(export_df.columns)), "coordinates",
+        coordinates_json(df["polygon"].tolist())
+    )
+    centers = np.array(df["Center"].tolist(), dtype=float).reshape(-1, 2)
+    export_df["Center"] = pc.binary_join_element_wise(
+        "[", _json_numbers(centers[:, 0]), ", ", _json_numbers(centers[:, 1]), "]", ""
+    ).to_numpy(zero_copy_only=False)
+    return export_df
+
+
+ZONE_ARTIFACT_KEY = b"kmz_zone_app"
+ZONE_ARTIFACT_VERSION = 1
+
+
+def _arrow_text_column(values):
+    """عامود نصي لـ Arrow، مع تحويل القيم المختلطة (أرقام ونصوص) إلى نص"""
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if pd.isna(v) else str(v) for v in values])
+
+
+def compile_zones(df, target, source_name="", source_sha256=""):
+    """كتابة طبقة الزونات كملف Parquet مجمّع
+
+    الهندسة كـ WKB مع Area/Center محسوبة مسبقاً وبيانات المصدر في metadata الملف.
+    target: مسار ملف أو file-like.
+    """
+    centers = np.array(df["Center"].tolist(), dtype=float).reshape(-1, 2)
+    table = pa.table({
+        "polygon_id": pa.array(df["polygon_id"].to_numpy(dtype=np.int64)),
+        "square_number": _arrow_text_column(df["square_number"]),
+        "sign_number": _arrow_text_column(df["sign_number"]),
+        "geometry": pa.array(shapely.to_wkb(np.asarray(df["polygon"].tolist(), dtype=object)),
+                             type=pa.binary()),
+        "Area": pa.array(df["Area"].to_numpy(dtype=float)),
+        "center_lon": pa.array(centers[:, 0]),
+        "center_lat": pa.array(centers[:, 1])
+    })
+
+    metadata = {
+        "format_version": ZONE_ARTIFACT_VERSION,
+        "source_name": source_name,
+        "source_sha256": source_sha256,
+        "zone_count": len(df),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+    table = table.replace_schema_metadata({
+        ZONE_ARTIFACT_KEY: json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+    })
+    pq.write_table(table, target)
+
+
+def load_compiled_zones(source):
+    """تحميل ملف زونات مجمّع (Parquet) وبناء الفهرس المكاني دفعة واحدة
+
+    source: مسار ملف (يُقرأ عبر memory map) أو file-like.
+    بيانات المصدر في df.attrs["source"].
+    """
+    if isinstance(source, (str, os.PathLike)):
+        table = pq.read_table(source, memory_map=True)
+    else:
+        data = source.getvalue() if hasattr(source, "getvalue") else source.read()
+        table = pq.read_table(pa.BufferReader(data))
+
+    metadata = (table.schema.metadata or {}).get(ZONE_ARTIFACT_KEY)
+    if metadata is None:
+        raise ValueError("الملف ليس ملف زونات مجمّع")
+    metadata = json.loads(metadata)
+    if metadata.get("format_version") != ZONE_ARTIFACT_VERSION:
+        raise ValueError(f"إصدار ملف الزونات غير مدعوم: {metadata.get('format_version')}")
+
+    polygons = shapely.from_wkb(table.column("geometry").to_numpy(zero_copy_only=False))
+
+    df = pd.DataFrame({
+        "polygon_id": table.column("polygon_id").to_numpy(),
+        "square_number": pd.Series(table.column("square_number").to_pylist(), dtype=object),
+        "sign_number": pd.Series(table.column("sign_number").to_pylist(), dtype=object),
+        "polygon": pd.Series(polygons, dtype=object),
+        "Area": table.column("Area").to_numpy(),
+        "Center": list(zip(
+            table.column("center_lon").to_pylist(),
+            table.column("center_lat").to_pylist()
+        ))
+    })
+    df.attrs["source"] = metadata
+
+    spatial_index = ZoneIndex(df)
+    return df, spatial_index
+
+
+def load_zone_layer(path, accurate_area=False, monitor=None):
+    """تحميل طبقة زونات من مسار حسب امتداده (kmz / kml / xlsx / parquet مجمّع)"""
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in (".kmz", ".kml"):
+        with open(path, "rb") as f:
+            return parse_kmz_or_kml(f, accurate_area, monitor)
+    if ext == ".xlsx":
+        return load_polygons_from_excel(path, accurate_area)
+    if ext == ".parquet":
+        return load_compiled_zones(path)
+    raise ValueError(f"نوع ملف زونات غير مدعوم: {ext}")
+
+
+def file_sha256(uploaded_file):
+    """بصمة SHA-256 لمحتوى الملف المرفوع"""
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+def zone_layer_nbytes(df, spatial_index=None):
+    """تقدير حجم طبقة الزونات في الذاكرة (الجدول + الهندسة + الفهرس)
+
+    إذا كان الجدول الشبكي مفعّلاً في spatial_index يُحسب حده الأقصى للذاكرة أيضاً،
+    لأنه يُبنى لاحقاً (عند أول بحث) بعد حفظ الطبقة في الذاكرة المؤقتة.
+    """
+    n_coords = int(shapely.get_num_coordinates(np.asarray(df["polygon"].tolist(), dtype=object)).sum())
+    table_bytes = int(df.drop(columns=["polygon"]).memory_usage(deep=True).sum())
+    # تقريباً: إحداثيات GEOS لكل رأس (x, y, z) + البوليقون والفهرس لكل زون
+    # + المستطيلات الداخلية (4 float64 وعلامة "محسوب" لكل زون)
+    grid_config = getattr(spatial_index, "grid_config", None)
+    grid_bytes = grid_config[1] if grid_config is not None else 0
+    return table_bytes + n_coords * 24 + len(df) * (512 + 33) + grid_bytes
+
+
+class ZoneLayerCache:
+    """ذاكرة مؤقتة LRU لطبقات الزونات بحد أقصى للحجم، آمنة للاستخدام من عدة جلسات"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """إرجاع (df, spatial_index) من الذاكرة أو تحميلها بـ loader وحفظها"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][:2]
+
+        df, spatial_index = loader()
+        nbytes = zone_layer_nbytes(df, spatial_index)
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (df, spatial_index, nbytes)
+                self.total_bytes += nbytes
+                # حذف الأقدم استخداماً حتى نرجع تحت الحد
+                while self.total_bytes > self.max_bytes:
+                    _, (_, _, old_bytes) = self._entries.popitem(last=False)
+                    self.total_bytes -= old_bytes
+        return df, spatial_index
+
+    def __len__(self):
+        return len(self._entries)